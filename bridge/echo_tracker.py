@@ -0,0 +1,133 @@
+"""
+Serial link latency from echoed sequence numbers
+Frames sent with FLAG_ECHO are answered by the firmware with "ACK:<seq>:<micros>"
+"""
+
+import threading
+import time
+from typing import Callable, Optional
+
+from loop_timing import LatencyHistogram
+
+ACK_PREFIX = "ACK:"
+
+
+class EchoTracker:
+    """
+    Matches ESP32 ACKs to sent frames and keeps RTT / one-way statistics
+
+    One-way latency uses the ESP32 micros() timestamp. The clock offset is
+    taken from the lowest-RTT sample seen so far (where one-way ~= RTT / 2),
+    so each command's one-way estimate includes any extra queueing on the
+    bridge -> ESP32 path rather than assuming the link is symmetric.
+
+    on_send() runs on the control loop; handle_line() runs on the reader thread.
+    """
+
+    def __init__(self, interval_s: float = 10.0, drop_timeout_s: float = 0.5,
+                 clock: Callable[[], float] = time.monotonic):
+        self.interval_s = interval_s
+        self.drop_timeout_s = drop_timeout_s
+        self._clock = clock
+        self._lock = threading.Lock()
+
+        # Indexed by 8-bit sequence number; None means no probe outstanding
+        self._sent_at = [None] * 256
+
+        self.rtt = LatencyHistogram()
+        self.one_way = LatencyHistogram()
+        self.sent = 0
+        self.acked = 0
+        self.dropped = 0
+        self.reordered = 0
+        self._last_ack_seq: Optional[int] = None
+
+        # ESP32 clock model: mcu_seconds - offset = bridge monotonic seconds
+        self._best_rtt = float('inf')
+        self._offset: Optional[float] = None
+        self._last_micros: Optional[int] = None
+        self._micros_wraps = 0
+
+        self._window_start = clock()
+
+    def on_send(self, seq: int, sent_at: float):
+        """Record that an echo-requesting frame left the bridge"""
+        with self._lock:
+            if self._sent_at[seq] is not None:
+                self.dropped += 1  # Wrapped around without ever being acknowledged
+            self._sent_at[seq] = sent_at
+            self.sent += 1
+
+    def handle_line(self, line: str, received_at: float) -> bool:
+        """Consume an ACK line from the reader thread; return False for other lines"""
+        if not line.startswith(ACK_PREFIX):
+            return False
+        try:
+            seq_str, micros_str = line[len(ACK_PREFIX):].split(':')
+            seq, micros = int(seq_str) & 0xFF, int(micros_str)
+        except ValueError:
+            return False
+
+        # Claim the probe atomically: on_send() may reuse the slot and maybe_report() expire it
+        with self._lock:
+            sent_at = self._sent_at[seq]
+            self._sent_at[seq] = None
+        if sent_at is None:
+            return True  # Late ACK for a probe already counted as dropped
+        rtt = received_at - sent_at
+
+        with self._lock:
+            self._record(seq, sent_at, micros, rtt)
+        return True
+
+    def _record(self, seq: int, sent_at: float, micros: int, rtt: float):
+        self.acked += 1
+
+        if self._last_ack_seq is not None and ((seq - self._last_ack_seq) & 0xFF) > 128:
+            self.reordered += 1
+        else:
+            self._last_ack_seq = seq
+
+        # micros() is uint32 and wraps every ~71 minutes; small backward steps are reordering
+        wraps = self._micros_wraps
+        if self._last_micros is None or micros > self._last_micros:
+            if self._last_micros is not None and micros - self._last_micros > 2**31:
+                wraps -= 1  # Reordered sample from before the last wrap
+            else:
+                self._last_micros = micros
+        elif self._last_micros - micros > 2**31:
+            self._micros_wraps += 1
+            wraps = self._micros_wraps
+            self._last_micros = micros
+        mcu_t = (micros + wraps * 2**32) / 1e6
+
+        self.rtt.record(rtt)
+
+        if rtt < self._best_rtt:
+            self._best_rtt = rtt
+            self._offset = mcu_t - (sent_at + rtt / 2)
+        self.one_way.record(mcu_t - self._offset - sent_at)
+
+    def _expire_pending(self, now: float):
+        for seq, sent_at in enumerate(self._sent_at):
+            if sent_at is not None and now - sent_at > self.drop_timeout_s:
+                self._sent_at[seq] = None
+                self.dropped += 1
+
+    def maybe_report(self, logger):
+        """Log RTT / one-way percentiles and link counters once per interval"""
+        if self.interval_s <= 0:
+            return
+        now = self._clock()
+        if now - self._window_start < self.interval_s:
+            return
+
+        with self._lock:
+            self._expire_pending(now)
+            logger.info(
+                f"Link: rtt {self.rtt.summary()} | one-way {self.one_way.summary()} | "
+                f"sent {self.sent} acked {self.acked} dropped {self.dropped} reordered {self.reordered}"
+            )
+            self.rtt.reset()
+            self.one_way.reset()
+        self._window_start = now
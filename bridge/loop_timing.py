@@ -0,0 +1,149 @@
+"""
+Loop timing helpers for the bridge
+Monotonic absolute-deadline scheduler plus latency/jitter histograms
+"""
+
+import time
+from typing import Callable, Dict, Optional
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram with O(1) record and cheap percentiles"""
+
+    def __init__(self, bucket_us: int = 50, max_ms: float = 100.0):
+        self.bucket_us = bucket_us
+        # One extra bucket collects everything above max_ms
+        self.num_buckets = int(max_ms * 1000 / bucket_us) + 1
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * self.num_buckets
+        self.count = 0
+        self.max_s = 0.0
+
+    def record(self, seconds: float):
+        seconds = max(0.0, seconds)
+        idx = min(int(seconds * 1e6) // self.bucket_us, self.num_buckets - 1)
+        self.counts[idx] += 1
+        self.count += 1
+        if seconds > self.max_s:
+            self.max_s = seconds
+
+    def percentile(self, pct: float) -> float:
+        """Return the upper edge of the bucket holding the pct-th sample (seconds)"""
+        if self.count == 0:
+            return 0.0
+        target = max(1, int(round(self.count * pct / 100.0)))
+        running = 0
+        for idx, n in enumerate(self.counts):
+            running += n
+            if running >= target:
+                if idx == self.num_buckets - 1:
+                    return self.max_s
+                return min((idx + 1) * self.bucket_us / 1e6, self.max_s)
+        return self.max_s
+
+    def summary(self) -> str:
+        return (f"p50 {self.percentile(50) * 1000:.2f} ms "
+                f"p99 {self.percentile(99) * 1000:.2f} ms "
+                f"max {self.max_s * 1000:.2f} ms")
+
+
+class DeadlineScheduler:
+    """
+    Paces a loop against absolute deadlines on the monotonic clock
+
+    Deadlines advance by exactly one period per tick, so sleep overshoot and
+    work time never accumulate into drift. When the loop falls more than one
+    period behind, the overrun policy decides what happens to missed ticks:
+      - 'skip':    drop them and realign to the next deadline on the grid
+      - 'catchup': run up to max_catchup of them back-to-back, skip the rest
+    """
+
+    POLICIES = ('skip', 'catchup')
+
+    def __init__(self, rate_hz: float, policy: str = 'skip', max_catchup: int = 3,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        if rate_hz <= 0:
+            raise ValueError(f"rate_hz must be positive, got {rate_hz}")
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown overrun policy '{policy}' (expected one of {self.POLICIES})")
+
+        self.period = 1.0 / rate_hz
+        self.policy = policy
+        self.max_catchup = max_catchup
+        self._clock = clock
+        self._sleep = sleep
+        self._deadline: Optional[float] = None
+        self.skipped_ticks = 0
+
+    def wait_next(self) -> float:
+        """Sleep until the next deadline; return how late we woke up (seconds)"""
+        now = self._clock()
+
+        if self._deadline is None:
+            self._deadline = now
+        else:
+            self._deadline += self.period
+            behind = now - self._deadline
+            if behind > self.period:
+                missed = int(behind // self.period)
+                # 'catchup' replays the newest max_catchup missed ticks and drops the rest
+                skip = missed if self.policy == 'skip' else max(0, missed - self.max_catchup)
+                self._deadline += skip * self.period
+                self.skipped_ticks += skip
+
+        delay = self._deadline - now
+        if delay > 0:
+            self._sleep(delay)
+            now = self._clock()
+
+        return now - self._deadline
+
+
+class TickStats:
+    """
+    Collects per-tick wait and work latency and reports them periodically
+
+    The wait histogram is deadline jitter in timer mode and message age
+    (publish -> forward) in event mode; wait_label names it in the log line.
+    """
+
+    def __init__(self, interval_s: float = 10.0, wait_label: str = 'jitter',
+                 clock: Callable[[], float] = time.monotonic):
+        self.interval_s = interval_s
+        self.wait_label = wait_label
+        self._clock = clock
+        self.jitter = LatencyHistogram()
+        self.latency = LatencyHistogram()
+        self._window_start = clock()
+        self._window_skipped = 0
+
+    def record(self, jitter_s: float, latency_s: float):
+        self.jitter.record(jitter_s)
+        self.latency.record(latency_s)
+
+    def maybe_report(self, logger, skipped_ticks: int = 0, counters: Optional[Dict[str, int]] = None):
+        """Log a summary line once per interval and start a new window
+
+        counters are cumulative totals appended to the line as-is.
+        """
+        if self.interval_s <= 0:
+            return
+        now = self._clock()
+        elapsed = now - self._window_start
+        if elapsed < self.interval_s:
+            return
+
+        rate = self.latency.count / elapsed if elapsed > 0 else 0.0
+        line = (f"Loop: {rate:.1f} Hz | {self.wait_label} {self.jitter.summary()} | "
+                f"tick {self.latency.summary()} | skipped {skipped_ticks - self._window_skipped}")
+        if counters:
+            line += " | " + " ".join(f"{name} {value}" for name, value in counters.items())
+        logger.info(line)
+
+        self.jitter.reset()
+        self.latency.reset()
+        self._window_start = now
+        self._window_skipped = skipped_ticks
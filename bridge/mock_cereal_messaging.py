@@ -10,6 +10,10 @@ class MockMessage:
     class Actuators:
         def __init__(self):
             self.steer = 0.0
+            # Typed fields read by steer_extractor when steer_control_type is set
+            self.torque = 0.0
+            self.steeringAngleDeg = 0.0
+            self.curvature = 0.0
     
     class CarControl:
         def __init__(self):
@@ -21,8 +25,9 @@ class MockMessage:
 
 class SubMaster:
     """Mock SubMaster that simulates openpilot messaging"""
-    def __init__(self, topics, addr=None):
+    def __init__(self, topics, poll=None, addr=None):
         self.topics = topics if isinstance(topics, list) else [topics]
+        self.poll = poll
         self.addr = addr
         self.frame = 0
         self.updated = {topic: False for topic in self.topics}
@@ -38,6 +43,9 @@ class SubMaster:
     
     def update(self, timeout=None):
         """Update messages - in mock mode, does nothing"""
+        if self.poll and timeout:
+            # Emulate blocking on a ~100 Hz socket
+            time.sleep(min(timeout, 10) / 1000.0)
         self.frame += 1
         # Simulate occasional updates
         if self.frame % 10 == 0:
@@ -8,11 +8,17 @@ import argparse
 import logging
 import sys
 import time
-from typing import Optional
+from typing import List, Optional
 
 import serial
 import yaml
 
+from loop_timing import DeadlineScheduler, TickStats
+import serial_protocol
+from serial_reader import SerialReader
+from echo_tracker import EchoTracker
+import steer_extractor
+
 # Openpilot imports
 try:
     import os
@@ -51,19 +57,55 @@ class OpenpilotSerialBridge:
         )
         self.logger = logging.getLogger(__name__)
         
-        # Initialize serial connection
+        # Initialize serial connection (negotiates self.protocol)
+        self.protocol = 'ascii'
+        self.tx_seq = 0
+        
+        # Change suppression: resend unchanged PWM only at the keep-alive floor
+        self.last_sent_pwm = None
+        self.last_sent_time = 0.0
+        self.keepalive_floor_s = self.config['keepalive_fraction'] * self.config['watchdog_timeout_ms'] / 1000.0
+        self.counters = {'sent': 0, 'suppressed': 0}
         self.serial_port = self._init_serial()
         
+        # Sequence echoes need the binary frame's seq field
+        self.echo = None
+        self.echo_countdown = 0
+        if self.config['echo_every'] > 0:
+            if self.protocol == 'binary':
+                self.echo = EchoTracker(self.config['stats_interval_s'])
+            else:
+                self.logger.warning("echo_every needs the binary serial protocol - link latency disabled")
+        
+        # All reads after negotiation happen on a background thread
+        self.reader = None
+        if self.serial_port is not None:
+            handler = self.echo.handle_line if self.echo is not None else None
+            self.reader = SerialReader(self.serial_port, self.logger, handler=handler)
+            self.reader.start()
+        
         # Initialize openpilot messaging
+        # In event mode SubMaster.update() blocks on the carControl socket only
+        sm_kwargs = {'poll': 'carControl'} if self.config['bridge_mode'] == 'event' else {}
         op_host = self.config.get('openpilot_host', None)
         if op_host:
-            self.sm = messaging.SubMaster(['carControl', 'controlsState'], addr=op_host)
+            self.sm = messaging.SubMaster(['carControl', 'controlsState'], addr=op_host, **sm_kwargs)
             self.logger.info(f"Connecting to remote openpilot: {op_host}")
         else:
-            self.sm = messaging.SubMaster(['carControl', 'controlsState'])
+            self.sm = messaging.SubMaster(['carControl', 'controlsState'], **sm_kwargs)
             self.logger.info("Connecting to local openpilot")
         
-        self.logger.info(f"Bridge initialized: {self.config['serial_port']} @ {self.config['baud_rate']}")
+        baud = self.serial_port.baudrate if self.serial_port is not None else self.config['baud_rate']
+        self.logger.info(f"Bridge initialized: {self.config['serial_port']} @ {baud}")
+        self.logger.info(f"Mode: {self.config['bridge_mode']}, protocol: {self.protocol}")
+        
+        # Pick the actuator field once instead of probing every tick
+        control_type = self.config['steer_control_type']
+        if control_type == 'auto':
+            # The local Params store only describes the car when openpilot runs on this machine
+            control_type = None if op_host else steer_extractor.read_steer_control_type()
+        self.extract_steer = steer_extractor.make_steer_extractor(control_type)
+        self.logger.info(f"Steer control type: {control_type or 'unknown (probing each message)'}")
         self.logger.info(f"PWM scale: {self.config['pwm_scale']}, cap: {self.config['pwm_cap']}")
         
     def _load_config(self, config_path: str) -> dict:
@@ -74,11 +116,33 @@ class OpenpilotSerialBridge:
             
             # Set defaults
             config.setdefault('baud_rate', 115200)
+            config.setdefault('max_baud_rate', config['baud_rate'])
             config.setdefault('pwm_scale', 150)
             config.setdefault('pwm_cap', 255)
             config.setdefault('stream_hz', 20)
             config.setdefault('serial_port', '/dev/ttyUSB0')
             config.setdefault('mock_mode', False)
+            config.setdefault('ready_timeout_s', 3.0)
+            config.setdefault('overrun_policy', 'skip')
+            config.setdefault('max_catchup_ticks', 3)
+            config.setdefault('stats_interval_s', 10.0)
+            config.setdefault('bridge_mode', 'timer')
+            config.setdefault('keepalive_interval_s', 0.2)
+            config.setdefault('command_timeout_s', 0.5)
+            config.setdefault('serial_protocol', 'auto')
+            config.setdefault('echo_every', 0)
+            config.setdefault('steer_control_type', 'auto')
+            config.setdefault('suppress_unchanged', False)
+            config.setdefault('pwm_deadband', 0)
+            config.setdefault('watchdog_timeout_ms', 500)
+            config.setdefault('keepalive_fraction', 0.4)
+            
+            if config['bridge_mode'] not in ('timer', 'event'):
+                raise ValueError(f"bridge_mode must be 'timer' or 'event', got '{config['bridge_mode']}'")
+            if config['steer_control_type'] not in ('auto',) + steer_extractor.CONTROL_TYPES:
+                raise ValueError(f"steer_control_type must be 'auto' or one of {steer_extractor.CONTROL_TYPES}")
+            if config['serial_protocol'] not in ('auto', 'ascii'):
+                raise ValueError(f"serial_protocol must be 'auto' or 'ascii', got '{config['serial_protocol']}'")
             
             return config
         except Exception as e:
@@ -97,44 +161,153 @@ class OpenpilotSerialBridge:
                 baudrate=self.config['baud_rate'],
                 timeout=0.1
             )
-            time.sleep(2)  # Wait for ESP32 to initialize
+            # Wait for the ESP32 to boot, but only as long as it actually takes. A previous
+            # bridge may have left it at a negotiated rate, so those are probed too
+            start = time.monotonic()
+            ready_msg = serial_protocol.wait_until_ready(ser, self.config['ready_timeout_s'],
+                                                         baud_rates=self._higher_baud_rates())
+            if ready_msg is not None:
+                self.logger.info(f"ESP32 ready after {(time.monotonic() - start) * 1000:.0f} ms "
+                                 f"at {ser.baudrate} baud: {ready_msg}")
+            else:
+                self.logger.warning(f"ESP32 not ready after {self.config['ready_timeout_s']} s - continuing anyway")
+            
+            if self.config['max_baud_rate'] > self.config['baud_rate']:
+                self._negotiate_baud(ser)
             
-            # Read startup message
-            if ser.in_waiting:
-                startup_msg = ser.readline().decode('utf-8', errors='ignore').strip()
-                self.logger.info(f"ESP32: {startup_msg}")
+            if self.config['serial_protocol'] == 'auto':
+                self.protocol = self._negotiate_protocol(ser)
             
             return ser
         except serial.SerialException as e:
             self.logger.error(f"Failed to open serial port: {e}")
             sys.exit(1)
     
+    def _await_reply(self, ser: serial.Serial, request: bytes, expected: str,
+                     timeout: float = 0.5) -> Optional[str]:
+        """Send a request line and return the expected reply or an ERROR line (None on timeout)"""
+        ser.reset_input_buffer()
+        ser.write(request)
+        
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            reply = ser.readline().decode('utf-8', errors='ignore').strip()
+            if reply == expected or reply.startswith("ERROR"):
+                return reply
+        return None
+    
+    def _ping(self, ser: serial.Serial) -> bool:
+        return self._await_reply(ser, serial_protocol.PING, serial_protocol.PONG, 0.3) == serial_protocol.PONG
+    
+    def _higher_baud_rates(self) -> List[int]:
+        """Rates above baud_rate, up to max_baud_rate, fastest first"""
+        return [r for r in serial_protocol.BAUD_RATES
+                if self.config['baud_rate'] < r <= self.config['max_baud_rate']]
+    
+    def _negotiate_baud(self, ser: serial.Serial):
+        """Step the link up to the fastest rate both sides support
+        
+        The firmware only keeps a new rate once it gets a PING at that rate, and
+        reverts to the default on its own otherwise, so a rate that produces
+        framing errors just falls through to the next lower candidate.
+        """
+        base_rate = self.config['baud_rate']
+        candidates = self._higher_baud_rates()
+        
+        if not self._ping(ser):
+            # A previous bridge may have left the firmware at a higher rate
+            for rate in candidates:
+                ser.baudrate = rate
+                if self._ping(ser):
+                    self.logger.info(f"ESP32 already at {rate} baud")
+                    break
+            else:
+                ser.baudrate = base_rate
+                self.logger.warning(f"ESP32 did not answer PING - staying at {base_rate} baud")
+                return
+        
+        for rate in candidates:
+            if rate <= ser.baudrate:
+                break
+            reply = self._await_reply(ser, f"BAUD:{rate}\n".encode('utf-8'), f"OK:BAUD:{rate}", 0.3)
+            if reply != f"OK:BAUD:{rate}":
+                continue  # Firmware doesn't support this rate
+            
+            ser.flush()
+            ser.baudrate = rate
+            time.sleep(0.01)  # Let the firmware reconfigure its UART
+            if self._ping(ser):
+                break
+            
+            # Unconfirmed rates revert to the firmware default, not the previous rate
+            self.logger.warning(f"Link unreliable at {rate} baud - falling back")
+            ser.baudrate = base_rate
+            time.sleep(serial_protocol.BAUD_CONFIRM_S)
+        
+        self.logger.info(f"Serial link at {ser.baudrate} baud")
+    
+    def _negotiate_protocol(self, ser: serial.Serial) -> str:
+        """Ask the firmware for binary framing; fall back to ASCII if it doesn't answer"""
+        reply = self._await_reply(ser, serial_protocol.PROTO_REQUEST, serial_protocol.PROTO_ACK)
+        if reply == serial_protocol.PROTO_ACK:
+            self.logger.info("ESP32 supports binary framing")
+            return 'binary'
+        
+        self.logger.warning("ESP32 firmware has no binary framing - using ASCII protocol")
+        return 'ascii'
+    
+    def _encode_command(self, pwm_value: int, flags: int = 0) -> bytes:
+        """Encode a PWM command in the negotiated protocol"""
+        if self.protocol == 'binary':
+            frame = serial_protocol.encode_frame(self.tx_seq, pwm_value, flags)
+            self.tx_seq = (self.tx_seq + 1) & 0xFF
+            return frame
+        if flags & serial_protocol.FLAG_STOP:
+            return b"STOP\n"
+        return f"S:{pwm_value:+d}\n".encode('utf-8')
+    
+    def _suppress(self, pwm_value: int, now: float) -> bool:
+        """True if pwm_value is within the deadband of the last send and the keep-alive isn't due"""
+        if not self.config['suppress_unchanged'] or self.last_sent_pwm is None:
+            return False
+        if abs(pwm_value - self.last_sent_pwm) > self.config['pwm_deadband']:
+            return False
+        return now - self.last_sent_time < self.keepalive_floor_s
+    
     def _send_command(self, pwm_value: int):
         """Send PWM command to ESP32"""
         # Clamp to safety limits
         pwm_value = max(-self.config['pwm_cap'], min(self.config['pwm_cap'], pwm_value))
         
-        # Format command
-        command = f"S:{pwm_value:+d}\n"
+        now = time.monotonic()
+        if self._suppress(pwm_value, now):
+            self.counters['suppressed'] += 1
+            return
+        self.last_sent_pwm = pwm_value
+        self.last_sent_time = now
+        self.counters['sent'] += 1
         
         # Mock mode - just log
         if self.serial_port is None:
             if self.debug:
-                self.logger.debug(f"MOCK: {command.strip()}")
+                self.logger.debug(f"MOCK: S:{pwm_value:+d}")
             return
         
+        flags = 0
+        if self.echo is not None:
+            self.echo_countdown -= 1
+            if self.echo_countdown <= 0:
+                flags = serial_protocol.FLAG_ECHO
+                self.echo_countdown = self.config['echo_every']
+                self.echo.on_send(self.tx_seq, now)
+        
         try:
-            self.serial_port.write(command.encode('utf-8'))
+            self.serial_port.write(self._encode_command(pwm_value, flags))
             
             if self.debug:
-                self.logger.debug(f"Sent: {command.strip()}")
-                
-            # Check for ESP32 errors
-            if self.serial_port.in_waiting:
-                response = self.serial_port.readline().decode('utf-8', errors='ignore').strip()
-                if response:
-                    self.logger.warning(f"ESP32: {response}")
-                    
+                self.logger.debug(f"Sent: S:{pwm_value:+d} ({self.protocol})")
+            
+            # ESP32 replies and errors are handled by the reader thread
         except serial.SerialException as e:
             self.logger.error(f"Serial write failed: {e}")
             self._emergency_stop()
@@ -146,79 +319,109 @@ class OpenpilotSerialBridge:
             return
             
         try:
-            self.serial_port.write(b"STOP\n")
+            self.serial_port.write(self._encode_command(0, serial_protocol.FLAG_STOP))
             self.logger.warning("Emergency STOP sent")
         except Exception as e:
             self.logger.error(f"Failed to send STOP: {e}")
     
-    def _get_steer_command(self) -> Optional[float]:
+    def _get_steer_command(self, timeout_ms: int = 0) -> Optional[float]:
         """Extract steering command from openpilot messages"""
-        self.sm.update(0)  # Non-blocking update
-        
-        # Priority 1: carControl.actuators (the actual control command)
-        if self.sm.updated['carControl']:
-            cc = self.sm['carControl']
-            if hasattr(cc, 'actuators'):
-                # For angle-based control, use steeringAngleDeg
-                if hasattr(cc.actuators, 'steeringAngleDeg'):
-                    angle = float(cc.actuators.steeringAngleDeg)
-                    # Normalize to -1..+1 (typical max steering ~180 degrees)
-                    return angle / 180.0
-                # For torque-based control, use torque directly
-                elif hasattr(cc.actuators, 'torque'):
-                    return float(cc.actuators.torque)
-                # For curvature-based, convert to normalized value
-                elif hasattr(cc.actuators, 'curvature'):
-                    # Curvature is 1/radius in meters
-                    # Typical range is about -0.1 to +0.1 (1/m)
-                    # Scale to -1..+1 for our purposes
-                    curvature = float(cc.actuators.curvature)
-                    return curvature * 10.0  # Rough scaling factor
-        
-        # Priority 2: controlsState.desiredCurvature (fallback)
-        if self.sm.updated['controlsState']:
-            cs = self.sm['controlsState']
-            if hasattr(cs, 'desiredCurvature'):
-                curvature = float(cs.desiredCurvature)
-                # Scale curvature to -1..+1 range
-                return curvature * 10.0
+        self.sm.update(timeout_ms)  # Non-blocking unless a timeout is given
+        return self.extract_steer(self.sm)
+    
+    def _carcontrol_age(self) -> float:
+        """Seconds since controlsd published the current carControl (0 if unknown)"""
+        # cereal's new_message() stamps logMonoTime with time.monotonic() on the publishing
+        # host (controlsd is Python), so only a local publisher shares our clock
+        log_mono_time = getattr(self.sm, 'logMonoTime', None)
+        if log_mono_time is None or self.config.get('openpilot_host'):
+            return 0.0
+        return (time.monotonic_ns() - log_mono_time['carControl']) / 1e9
+    
+    def _forward_steer(self, steer: float, last_steer: float) -> int:
+        """Scale steer to PWM and send it to the ESP32"""
+        pwm_value = int(steer * self.config['pwm_scale'])
+        self._send_command(pwm_value)
         
-        return None
+        if self.debug and abs(steer - last_steer) > 0.01:
+            self.logger.debug(f"Steer: {steer:+.3f} -> PWM: {pwm_value:+d}")
+        
+        return pwm_value
+    
+    def _run_timer(self, stats: TickStats):
+        """Poll openpilot on a fixed stream_hz schedule"""
+        scheduler = DeadlineScheduler(
+            self.config['stream_hz'],
+            policy=self.config['overrun_policy'],
+            max_catchup=self.config['max_catchup_ticks']
+        )
+        last_steer = 0.0
+        
+        while True:
+            # Sleep until the next absolute deadline on the monotonic clock
+            jitter = scheduler.wait_next()
+            tick_start = time.monotonic()
+            
+            # Get steering command from openpilot
+            steer = self._get_steer_command()
+            
+            if steer is not None:
+                self._forward_steer(steer, last_steer)
+                last_steer = steer
+            else:
+                # No command - send neutral but don't stop (openpilot might be starting up)
+                if self.debug:
+                    self.logger.debug("No steer command available")
+            
+            stats.record(jitter, time.monotonic() - tick_start)
+            stats.maybe_report(self.logger, scheduler.skipped_ticks, self.counters)
+            if self.echo is not None:
+                self.echo.maybe_report(self.logger)
+    
+    def _run_event(self, stats: TickStats):
+        """Forward each carControl as soon as it arrives
+        
+        The keep-alive timeout only re-sends the last PWM so the firmware
+        watchdog stays fed across short gaps. Once the last command is older
+        than command_timeout_s nothing is sent and the watchdog stops the motor.
+        """
+        keepalive_ms = int(self.config['keepalive_interval_s'] * 1000)
+        command_timeout = self.config['command_timeout_s']
+        last_steer = 0.0
+        last_pwm = None
+        last_command_time = 0.0
+        
+        while True:
+            # Blocks until carControl arrives or the keep-alive interval expires
+            steer = self._get_steer_command(keepalive_ms)
+            tick_start = time.monotonic()
+            
+            if steer is not None:
+                age = self._carcontrol_age() if self.sm.updated['carControl'] else 0.0
+                last_pwm = self._forward_steer(steer, last_steer)
+                last_steer = steer
+                last_command_time = tick_start
+                stats.record(age, time.monotonic() - tick_start)
+            elif last_pwm is not None and tick_start - last_command_time < command_timeout:
+                self._send_command(last_pwm)
+                if self.debug:
+                    self.logger.debug(f"Keep-alive: PWM {last_pwm:+d}")
+            elif self.debug:
+                self.logger.debug("No steer command available")
+            
+            stats.maybe_report(self.logger, counters=self.counters)
+            if self.echo is not None:
+                self.echo.maybe_report(self.logger)
     
     def run(self):
         """Main bridge loop"""
         self.logger.info("Bridge running. Press Ctrl+C to stop.")
         
-        loop_period = 1.0 / self.config['stream_hz']
-        last_steer = 0.0
-        
         try:
-            while True:
-                loop_start = time.time()
-                
-                # Get steering command from openpilot
-                steer = self._get_steer_command()
-                
-                if steer is not None:
-                    # Scale to PWM
-                    pwm_value = int(steer * self.config['pwm_scale'])
-                    
-                    # Send to ESP32
-                    self._send_command(pwm_value)
-                    
-                    if self.debug and abs(steer - last_steer) > 0.01:
-                        self.logger.debug(f"Steer: {steer:+.3f} -> PWM: {pwm_value:+d}")
-                    
-                    last_steer = steer
-                else:
-                    # No command - send neutral but don't stop (openpilot might be starting up)
-                    if self.debug:
-                        self.logger.debug("No steer command available")
-                
-                # Maintain update rate
-                elapsed = time.time() - loop_start
-                sleep_time = max(0, loop_period - elapsed)
-                time.sleep(sleep_time)
+            if self.config['bridge_mode'] == 'event':
+                self._run_event(TickStats(self.config['stats_interval_s'], wait_label='age'))
+            else:
+                self._run_timer(TickStats(self.config['stats_interval_s']))
                 
         except KeyboardInterrupt:
             self.logger.info("\nShutting down...")
@@ -226,7 +429,10 @@ class OpenpilotSerialBridge:
             self.logger.error(f"Unexpected error: {e}", exc_info=True)
         finally:
             self._emergency_stop()
-            self.serial_port.close()
+            if self.reader is not None:
+                self.reader.stop()
+            if self.serial_port is not None:
+                self.serial_port.close()
             self.logger.info("Bridge stopped")
 
 
@@ -0,0 +1,111 @@
+"""
+Serial protocol shared by the bridge and test tools
+Must stay in sync with firmware/steering_motor/steering_motor.ino
+
+Frame layout (6 bytes, little-endian):
+  [0] SYNC  0xA5
+  [1] seq   uint8, wraps at 256
+  [2] pwm   int16 low byte
+  [3] pwm   int16 high byte
+  [4] flags uint8 (FLAG_*)
+  [5] crc   CRC-8 (poly 0x07, init 0x00) over bytes 1..4
+"""
+
+import struct
+import time
+from typing import Optional, Sequence, Tuple
+
+SYNC = 0xA5
+FRAME_LEN = 6
+FLAG_STOP = 0x01
+FLAG_ECHO = 0x02  # Firmware replies "ACK:<seq>:<micros>" after applying the frame
+
+# Negotiation: sent as an ASCII line, firmware that speaks binary replies PROTO_ACK.
+# Older firmware answers "ERROR: Invalid command" and the bridge stays on ASCII.
+PROTO_REQUEST = b"PROTO:BIN\n"
+PROTO_ACK = "OK:PROTO:BIN"
+
+# Liveness check, also used to confirm a new baud rate
+PING = b"PING\n"
+PONG = "PONG"
+
+# Printed once by setup() when the firmware is ready for commands
+READY_BANNER = "Steering Controller Ready"
+
+# Rates the firmware accepts in "BAUD:<rate>", fastest first. It replies
+# "OK:BAUD:<rate>" at the old rate, switches, and reverts to 115200 unless a
+# PING arrives at the new rate within BAUD_CONFIRM_S.
+BAUD_RATES = (2000000, 921600, 460800, 230400, 115200)
+BAUD_CONFIRM_S = 1.0
+
+_BODY = struct.Struct('<BhB')
+
+
+def _make_crc8_table(poly: int = 0x07) -> bytes:
+    table = bytearray(256)
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table[i] = crc
+    return bytes(table)
+
+
+_CRC8_TABLE = _make_crc8_table()
+
+
+def crc8(data: bytes) -> int:
+    """CRC-8/SMBUS (poly 0x07, init 0x00)"""
+    crc = 0
+    for b in data:
+        crc = _CRC8_TABLE[crc ^ b]
+    return crc
+
+
+def encode_frame(seq: int, pwm: int, flags: int = 0) -> bytes:
+    """Build a steering frame; pwm must already be clamped to int16 range"""
+    body = _BODY.pack(seq & 0xFF, pwm, flags & 0xFF)
+    return bytes((SYNC,)) + body + bytes((crc8(body),))
+
+
+def decode_frame(frame: bytes) -> Optional[Tuple[int, int, int]]:
+    """Parse a frame into (seq, pwm, flags), or None if sync/length/CRC are wrong"""
+    if len(frame) != FRAME_LEN or frame[0] != SYNC:
+        return None
+    body = frame[1:5]
+    if crc8(body) != frame[5]:
+        return None
+    return _BODY.unpack(body)
+
+
+def wait_until_ready(ser, timeout: float = 3.0, ping_interval: float = 0.1,
+                     baud_rates: Sequence[int] = ()) -> Optional[str]:
+    """
+    Block until the ESP32 can take commands, or timeout (returns None)
+
+    Ready means the boot banner was printed or a PING got any answer (firmware
+    without PING support still replies with an ERROR line). Returns that line.
+    A previous bridge may have left the firmware at a negotiated rate, so PINGs
+    rotate through ser's rate and baud_rates; ser is left at the rate that
+    answered (back at its own rate on timeout).
+    """
+    rates = [ser.baudrate] + [r for r in baud_rates if r != ser.baudrate]
+    deadline = time.monotonic() + timeout
+    next_ping = 0.0
+    attempt = 0
+    while time.monotonic() < deadline:
+        now = time.monotonic()
+        if now >= next_ping:
+            rate = rates[attempt % len(rates)]
+            if ser.baudrate != rate:
+                ser.baudrate = rate
+                ser.reset_input_buffer()  # Bytes received at the previous rate are garbage
+            ser.write(PING)
+            attempt += 1
+            next_ping = now + ping_interval
+
+        line = ser.readline().decode('utf-8', errors='ignore').strip()
+        if READY_BANNER in line or line == PONG or line.startswith("ERROR: Invalid command: PING"):
+            return line
+    ser.baudrate = rates[0]
+    return None
@@ -0,0 +1,75 @@
+"""
+Background reader for ESP32 serial output
+Keeps blocking reads off the control loop - the loop only ever writes
+"""
+
+import collections
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+import serial
+
+
+class SerialReader(threading.Thread):
+    """
+    Reads ESP32 lines on a daemon thread
+
+    ERROR lines are logged as soon as they arrive. An optional handler gets
+    first look at each line and returns True to consume it (e.g. ACK echoes).
+    Everything else is pushed onto a bounded deque (append/popleft are atomic
+    in CPython, so no lock is needed) for consumers, via drain().
+    """
+
+    def __init__(self, ser: serial.Serial, logger: logging.Logger, maxlen: int = 256,
+                 handler: Optional[Callable[[str, float], bool]] = None):
+        super().__init__(name='esp32-reader', daemon=True)
+        self.ser = ser
+        self.logger = logger
+        self.handler = handler
+        self.lines = collections.deque(maxlen=maxlen)
+        self.error_count = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                raw = self.ser.readline()  # Returns after the port timeout if idle
+            except (serial.SerialException, OSError, TypeError) as e:
+                # TypeError/OSError: port closed underneath us during shutdown
+                if not self._stop_event.is_set():
+                    self.logger.error(f"Serial read failed: {e}")
+                return
+
+            if not raw:
+                continue
+
+            received_at = time.monotonic()
+            line = raw.decode('utf-8', errors='ignore').strip()
+            if not line:
+                continue
+
+            if self.handler is not None and self.handler(line, received_at):
+                continue
+
+            if line.startswith("ERROR"):
+                self.error_count += 1
+                self.logger.warning(f"ESP32: {line}")
+            else:
+                self.logger.debug(f"ESP32: {line}")
+
+            self.lines.append((received_at, line))
+
+    def drain(self):
+        """Yield (timestamp, line) for every reply received since the last drain"""
+        while True:
+            try:
+                yield self.lines.popleft()
+            except IndexError:
+                return
+
+    def stop(self, timeout: float = 0.5):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
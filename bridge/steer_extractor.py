@@ -0,0 +1,97 @@
+"""
+Steer command extraction from openpilot messages
+The actuator field is chosen once at startup instead of probed every tick
+"""
+
+from typing import Callable, Optional
+
+# Normalization to roughly -1..+1
+ANGLE_SCALE = 1.0 / 180.0   # Typical max steering ~180 degrees
+CURVATURE_SCALE = 10.0      # Curvature (1/m) is typically -0.1..+0.1
+
+CONTROL_TYPES = ('angle', 'torque', 'curvature')
+
+SteerExtractor = Callable[[object], Optional[float]]
+
+
+def read_steer_control_type() -> Optional[str]:
+    """Return CarParams.steerControlType ('angle' / 'torque') or None if unavailable"""
+    try:
+        from cereal import car
+        from openpilot.common.params import Params
+    except ImportError:
+        return None
+
+    try:
+        cp_bytes = Params().get("CarParams")
+        if not cp_bytes:
+            return None
+        CP = car.CarParams.from_bytes(cp_bytes)
+        control_type = str(CP.steerControlType)
+    except Exception:
+        return None
+
+    return control_type if control_type in CONTROL_TYPES else None
+
+
+def _controls_state_fallback(sm) -> Optional[float]:
+    # Only reached when carControl didn't update, so the hasattr is off the hot path
+    if sm.updated['controlsState']:
+        cs = sm['controlsState']
+        if hasattr(cs, 'desiredCurvature'):
+            return cs.desiredCurvature * CURVATURE_SCALE
+    return None
+
+
+def _extract_angle(sm) -> Optional[float]:
+    if sm.updated['carControl']:
+        return sm['carControl'].actuators.steeringAngleDeg * ANGLE_SCALE
+    return _controls_state_fallback(sm)
+
+
+def _extract_torque(sm) -> Optional[float]:
+    if sm.updated['carControl']:
+        return sm['carControl'].actuators.torque
+    return _controls_state_fallback(sm)
+
+
+def _extract_curvature(sm) -> Optional[float]:
+    if sm.updated['carControl']:
+        return sm['carControl'].actuators.curvature * CURVATURE_SCALE
+    return _controls_state_fallback(sm)
+
+
+def extract_dynamic(sm) -> Optional[float]:
+    """Probe the message for whichever actuator field exists (unknown car / mock cereal)"""
+    # Priority 1: carControl.actuators (the actual control command)
+    if sm.updated['carControl']:
+        cc = sm['carControl']
+        if hasattr(cc, 'actuators'):
+            # For angle-based control, use steeringAngleDeg
+            if hasattr(cc.actuators, 'steeringAngleDeg'):
+                return float(cc.actuators.steeringAngleDeg) * ANGLE_SCALE
+            # For torque-based control, use torque directly
+            elif hasattr(cc.actuators, 'torque'):
+                return float(cc.actuators.torque)
+            # For curvature-based, convert to normalized value
+            elif hasattr(cc.actuators, 'curvature'):
+                return float(cc.actuators.curvature) * CURVATURE_SCALE
+
+    # Priority 2: controlsState.desiredCurvature (fallback)
+    return _controls_state_fallback(sm)
+
+
+_EXTRACTORS = {
+    'angle': _extract_angle,
+    'torque': _extract_torque,
+    'curvature': _extract_curvature,
+}
+
+
+def make_steer_extractor(control_type: Optional[str]) -> SteerExtractor:
+    """Bind the extractor for a control type; None falls back to per-tick probing"""
+    if control_type is None:
+        return extract_dynamic
+    if control_type not in _EXTRACTORS:
+        raise ValueError(f"Unknown steer control type '{control_type}' (expected one of {CONTROL_TYPES})")
+    return _EXTRACTORS[control_type]
@@ -4,6 +4,21 @@
  * Accepts ASCII serial commands and drives BTS7960 H-bridge bidirectionally
  * Command format: "S:<pwm>\n" where pwm in [-255, +255]
  *                 "STOP\n" for emergency halt
+ *                 "PROTO:BIN\n" switches to binary frames (replies "OK:PROTO:BIN")
+ *                 "PING\n" replies "PONG"
+ *                 "BAUD:<rate>\n" replies "OK:BAUD:<rate>" then switches rate; the
+ *                 new rate is kept only if a PING arrives within BAUD_CONFIRM_MS
+ * 
+ * Binary frame (6 bytes, see bridge/serial_protocol.py):
+ *   0xA5 | seq | pwm lo | pwm hi | flags | crc8(seq..flags)
+ * flags: bit 0 = STOP, bit 1 = ECHO (reply "ACK:<seq>:<micros>")
+ * Binary mode (stray bytes dropped for resync) reverts to ASCII when the
+ * watchdog fires, i.e. no command for WATCHDOG_TIMEOUT_MS after the switch or
+ * the last frame: silence is the only sign the bridge was restarted, and a new
+ * one starts over ASCII. Frames are accepted in either mode.
+ * 
+ * Serial input is drained into a fixed ring buffer and parsed byte by byte, so
+ * loop() never blocks on a partial command and runs at kHz rates.
  * 
  * Hardware: ESP32-S3 DevKitC-1 -> BTS7960 -> JGB37-545 12V motor
  */
@@ -24,8 +39,37 @@
 #define WATCHDOG_TIMEOUT_MS 500
 unsigned long lastCommandTime = 0;
 
+// Binary framing
+#define FRAME_SYNC 0xA5
+#define FRAME_LEN 6
+#define FLAG_STOP 0x01
+#define FLAG_ECHO 0x02  // Reply "ACK:<seq>:<micros>" for round-trip measurement
+bool binaryMode = false;
+
+// Receive ring buffer (size must be a power of two)
+#define RX_RING_SIZE 256
+#define RX_RING_MASK (RX_RING_SIZE - 1)
+uint8_t rxRing[RX_RING_SIZE];
+uint16_t rxHead = 0;  // Next write position
+uint16_t rxTail = 0;  // Next read position
+
+// ASCII line assembly (no String allocations)
+#define LINE_MAX 32
+char lineBuf[LINE_MAX + 1];
+uint8_t lineLen = 0;
+bool lineOverflow = false;
+
+bool motorActive = false;
+
+// Baud negotiation
+#define DEFAULT_BAUD 115200
+#define BAUD_CONFIRM_MS 1000
+const uint32_t SUPPORTED_BAUDS[] = {115200, 230400, 460800, 921600, 2000000};
+bool baudPending = false;  // Switched rate, waiting for a PING to confirm it
+unsigned long baudChangeTime = 0;
+
 void setup() {
-  Serial.begin(115200);
+  Serial.begin(DEFAULT_BAUD);
   
   // Configure PWM channels
   ledcSetup(RPWM_CHANNEL, PWM_FREQ, PWM_RESOLUTION);
@@ -41,33 +85,206 @@ void setup() {
   stopMotor();
   
   Serial.println("ESP32-S3 Steering Controller Ready");
-  Serial.println("Commands: S:<pwm> | STOP");
+  Serial.println("Commands: S:<pwm> | STOP | PROTO:BIN | PING | BAUD:<rate>");
 }
 
 void loop() {
-  // Check for serial commands
-  if (Serial.available() > 0) {
-    String command = Serial.readStringUntil('\n');
-    command.trim();
-    
-    if (command.startsWith("S:")) {
-      int pwm = command.substring(2).toInt();
-      setMotor(pwm);
-      lastCommandTime = millis();
-    } else if (command == "STOP") {
+  pumpSerial();
+  processRx();
+  
+  // Unconfirmed baud change: the bridge can't hear us, go back to the default
+  if (baudPending && millis() - baudChangeTime > BAUD_CONFIRM_MS) {
+    changeBaud(DEFAULT_BAUD);
+  }
+  
+  // Watchdog: stop if no command received recently
+  if (millis() - lastCommandTime > WATCHDOG_TIMEOUT_MS) {
+    if (motorActive) {
       stopMotor();
+    }
+    binaryMode = false;  // Bridge is gone - next one renegotiates over ASCII
+  }
+}
+
+uint16_t rxCount() {
+  return (rxHead - rxTail) & RX_RING_MASK;
+}
+
+uint8_t rxPeek(uint16_t offset) {
+  return rxRing[(rxTail + offset) & RX_RING_MASK];
+}
+
+void rxDrop(uint16_t n) {
+  rxTail = (rxTail + n) & RX_RING_MASK;
+}
+
+void pumpSerial() {
+  // Move everything the UART has into the ring without blocking
+  int avail = Serial.available();
+  while (avail-- > 0 && rxCount() < RX_RING_SIZE - 1) {
+    rxRing[rxHead] = (uint8_t)Serial.read();
+    rxHead = (rxHead + 1) & RX_RING_MASK;
+  }
+}
+
+void processRx() {
+  // Handle every complete command in the ring; leave a partial one for next loop
+  while (rxCount() > 0) {
+    uint8_t b = rxPeek(0);
+    
+    if (b == FRAME_SYNC) {
+      if (rxCount() < FRAME_LEN) {
+        return;  // Rest of the frame hasn't arrived yet
+      }
+      uint8_t frame[FRAME_LEN];
+      for (uint8_t i = 0; i < FRAME_LEN; i++) {
+        frame[i] = rxPeek(i);
+      }
+      if (crc8(frame + 1, 4) != frame[5]) {
+        // Drop only the sync byte so a real frame hiding behind it is found
+        rxDrop(1);
+        Serial.println("ERROR: Bad frame CRC");
+        stopMotor();
+        if (baudPending) {
+          changeBaud(DEFAULT_BAUD);  // Likely framing errors at the new rate
+          return;
+        }
+        continue;
+      }
+      rxDrop(FRAME_LEN);
+      lineLen = 0;  // A frame aborts any partial ASCII line
+      lineOverflow = false;
+      handleFrame(frame);
+      continue;
+    }
+    
+    rxDrop(1);
+    if (binaryMode) {
+      continue;  // Resync: drop stray bytes until the next sync byte
+    }
+    
+    if (b == '\n') {
+      lineBuf[lineLen] = '\0';
+      if (lineOverflow) {
+        Serial.println("ERROR: Command too long");
+        stopMotor();
+      } else if (lineLen > 0) {
+        handleLine(lineBuf, lineLen);
+      }
+      lineLen = 0;
+      lineOverflow = false;
+    } else if (b != '\r') {
+      if (lineLen < LINE_MAX) {
+        lineBuf[lineLen++] = (char)b;
+      } else {
+        lineOverflow = true;
+      }
+    }
+  }
+}
+
+void handleLine(char *line, uint8_t len) {
+  // Trim trailing spaces
+  while (len > 0 && line[len - 1] == ' ') {
+    line[--len] = '\0';
+  }
+  
+  if (strncmp(line, "S:", 2) == 0) {
+    char *end;
+    long pwm = strtol(line + 2, &end, 10);
+    if (end != line + 2 && *end == '\0') {
+      setMotor((int)constrain(pwm, -255, 255));
       lastCommandTime = millis();
-    } else {
-      Serial.print("ERROR: Invalid command: ");
-      Serial.println(command);
-      stopMotor();
+      return;
     }
+  } else if (strcmp(line, "STOP") == 0) {
+    stopMotor();
+    lastCommandTime = millis();
+    return;
+  } else if (strcmp(line, "PROTO:BIN") == 0) {
+    binaryMode = true;
+    lastCommandTime = millis();  // Watchdog counts from the switch, not the last S: command
+    Serial.println("OK:PROTO:BIN");
+    return;
+  } else if (strcmp(line, "PING") == 0) {
+    baudPending = false;  // Bridge hears us at this rate
+    Serial.println("PONG");
+    return;
+  } else if (strncmp(line, "BAUD:", 5) == 0) {
+    char *end;
+    uint32_t baud = strtoul(line + 5, &end, 10);
+    if (end != line + 5 && *end == '\0' && isSupportedBaud(baud)) {
+      Serial.print("OK:BAUD:");
+      Serial.println(baud);
+      changeBaud(baud);
+      baudPending = (baud != DEFAULT_BAUD);
+      return;
+    }
+    Serial.print("ERROR: Unsupported baud: ");
+    Serial.println(line + 5);
+    return;
   }
   
-  // Watchdog: stop if no command received recently
-  if (millis() - lastCommandTime > WATCHDOG_TIMEOUT_MS) {
+  Serial.print("ERROR: Invalid command: ");
+  Serial.println(line);
+  stopMotor();
+  if (baudPending) {
+    changeBaud(DEFAULT_BAUD);  // Garbage right after a switch means framing errors
+  }
+}
+
+bool isSupportedBaud(uint32_t baud) {
+  for (size_t i = 0; i < sizeof(SUPPORTED_BAUDS) / sizeof(SUPPORTED_BAUDS[0]); i++) {
+    if (SUPPORTED_BAUDS[i] == baud) {
+      return true;
+    }
+  }
+  return false;
+}
+
+void changeBaud(uint32_t baud) {
+  Serial.flush();  // Finish sending the reply at the old rate
+  Serial.updateBaudRate(baud);
+  
+  // Anything buffered was received at the old rate
+  rxHead = rxTail = 0;
+  lineLen = 0;
+  lineOverflow = false;
+  baudPending = false;
+  baudChangeTime = millis();
+}
+
+uint8_t crc8(const uint8_t *data, size_t len) {
+  // CRC-8/SMBUS: poly 0x07, init 0x00
+  uint8_t crc = 0;
+  for (size_t i = 0; i < len; i++) {
+    crc ^= data[i];
+    for (uint8_t bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x80) ? (uint8_t)((crc << 1) ^ 0x07) : (uint8_t)(crc << 1);
+    }
+  }
+  return crc;
+}
+
+void handleFrame(const uint8_t *frame) {
+  // CRC already verified by processRx()
+  unsigned long rxMicros = micros();
+  int16_t pwm = (int16_t)(frame[2] | (frame[3] << 8));
+  uint8_t flags = frame[4];
+  binaryMode = true;  // Valid frame: sender speaks binary
+
+  if (flags & FLAG_STOP) {
     stopMotor();
-    delay(10); // Prevent flooding
+  } else {
+    setMotor(pwm);
+  }
+  lastCommandTime = millis();
+
+  if (flags & FLAG_ECHO) {
+    Serial.print("ACK:");
+    Serial.print(frame[1]);
+    Serial.print(':');
+    Serial.println(rxMicros);
   }
 }
 
@@ -78,6 +295,7 @@ void setMotor(int pwm) {
   // Enable bridge
   digitalWrite(R_EN_PIN, HIGH);
   digitalWrite(L_EN_PIN, HIGH);
+  motorActive = true;
   
   if (pwm > 0) {
     // Clockwise (right turn)
@@ -100,4 +318,5 @@ void stopMotor() {
   ledcWrite(LPWM_CHANNEL, 0);
   digitalWrite(R_EN_PIN, LOW);
   digitalWrite(L_EN_PIN, LOW);
+  motorActive = false;
 }
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Check that the demo's filtered steering is released to 0 when lanes are lost
+
+Feeds SteeringFilter a full-lock measurement until it settles, then frames
+without a detection, and checks the output reaches exactly 0 within the
+expected number of frames (and is still held for the first max_coast).
+Runs without a camera or openpilot.
+
+Usage:
+    python3 scripts/check_steering_decay.py [--frames 40]
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from lane_detection import SteeringFilter
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=40, help='Frames without lanes by which steer must be 0')
+    args = parser.parse_args()
+
+    ok = True
+    for start in (1.0, -1.0):
+        steer_filter = SteeringFilter()
+        for _ in range(50):
+            steer_filter.update(start)
+        settled = steer_filter.value
+
+        outputs = [steer_filter.update(None) for _ in range(args.frames)]
+        held = all(v == settled for v in outputs[:steer_filter.max_coast])
+        zero_at = next((i + 1 for i, v in enumerate(outputs) if v == 0.0), None)
+        stays_zero = zero_at is not None and all(v == 0.0 for v in outputs[zero_at - 1:])
+
+        passed = held and stays_zero
+        ok &= passed
+        zero_text = f"0 after {zero_at} frames" if zero_at else f"still {outputs[-1]:+.3f} after {args.frames} frames"
+        print(f"{'✅' if passed else '❌'} steer {settled:+.3f} -> {zero_text} without lanes "
+              f"(held for {steer_filter.max_coast}: {'yes' if held else 'no'})")
+
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
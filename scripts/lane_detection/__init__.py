@@ -0,0 +1,30 @@
+"""
+Shared OpenCV lane detection for the webcam viewers
+
+    from lane_detection import LanePipeline, SIMPLE
+
+    pipeline = LanePipeline(SIMPLE)
+    result = pipeline.run(frame)        # result.left / result.right: np.poly1d or None
+    print(pipeline.timer.summary())     # per-stage ms/frame
+
+LaneTracker (strip tracking), BirdseyeLaneDetector (bird's-eye sliding
+windows) and PyramidLaneDetector (coarse-to-fine within a time budget) build
+on the same stages and expose update(frame) -> curves, Kalman-filtered
+across frames by a LaneFilter.
+"""
+
+from .birdseye import BirdseyeLaneDetector, BirdseyeLanes, BirdseyeWarp, SlidingWindowDetector
+from .kalman import LaneFilter, LaneKalman, SteeringFilter
+from .pipeline import (IMPROVED, SIMPLE, LanePipeline, LaneResult, PipelineConfig, StageTimer,
+                       fit_lane_curve, lane_deviation, line_rows, poly_coeffs, scaled_config, split_lanes)
+from .pyramid import LEVELS, LevelController, PyramidLaneDetector, PyramidLevel
+from .tracker import LaneTracker, StripSearch
+
+__all__ = [
+    'BirdseyeLaneDetector', 'BirdseyeLanes', 'BirdseyeWarp', 'SlidingWindowDetector',
+    'LaneFilter', 'LaneKalman', 'SteeringFilter',
+    'IMPROVED', 'SIMPLE', 'LanePipeline', 'LaneResult', 'PipelineConfig', 'StageTimer',
+    'fit_lane_curve', 'lane_deviation', 'line_rows', 'poly_coeffs', 'scaled_config', 'split_lanes',
+    'LEVELS', 'LevelController', 'PyramidLaneDetector', 'PyramidLevel',
+    'LaneTracker', 'StripSearch',
+]
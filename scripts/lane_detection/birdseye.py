@@ -0,0 +1,230 @@
+"""
+Bird's-eye lane detection: perspective warp + sliding-window histogram search
+
+The road ahead is warped to a top-down view through a remap table built once
+at startup. In that view lane lines are near-vertical and parallel, so they
+are found with a column histogram and followed upwards with sliding windows,
+without any Hough slope thresholds. Distances in the warped view are linear,
+which gives the lane offset and curve radius in metres directly.
+"""
+
+import time
+from dataclasses import dataclass
+from typing import Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from .kalman import LaneFilter
+from .pipeline import StageTimer
+
+LANE_WIDTH_M = 3.7      # Assumed lane width (the trapezoid's bottom edge spans one lane)
+LOOKAHEAD_M = 30.0      # Road distance covered by the warped view's height
+
+# Road trapezoid in the camera frame as fractions of (width, height):
+# bottom-left, bottom-right, top-right, top-left
+DEFAULT_SRC_QUAD = ((0.15, 0.95), (0.85, 0.95), (0.58, 0.62), (0.42, 0.62))
+
+
+class BirdseyeWarp:
+    """
+    Camera frame -> top-down view through one cached cv2.remap table
+
+    The table comes from cv2.initUndistortRectifyMap with the perspective
+    transform as the rectification, so lens undistortion (if camera_matrix
+    and dist_coeffs are given) is folded into the same single lookup.
+    """
+
+    def __init__(self, width: int, height: int, out_size: Tuple[int, int] = (400, 600),
+                 src_quad: Sequence[Tuple[float, float]] = DEFAULT_SRC_QUAD,
+                 camera_matrix: Optional[np.ndarray] = None, dist_coeffs: Optional[np.ndarray] = None):
+        self.width, self.height = width, height
+        self.out_w, self.out_h = out_size
+
+        src = np.float32([(x * width, y * height) for x, y in src_quad])
+        # The lane spans the middle half of the warped view
+        dst = np.float32([(self.out_w * 0.25, self.out_h), (self.out_w * 0.75, self.out_h),
+                          (self.out_w * 0.75, 0), (self.out_w * 0.25, 0)])
+        self.M = cv2.getPerspectiveTransform(src, dst)
+        self.M_inv = cv2.getPerspectiveTransform(dst, src)
+
+        # Metres per warped pixel
+        self.xm_per_px = LANE_WIDTH_M / (self.out_w * 0.5)
+        self.ym_per_px = LOOKAHEAD_M / self.out_h
+
+        # initUndistortRectifyMap inverts R, so pass the transform from normalized camera
+        # coordinates to warped pixels; with no intrinsics those are plain pixels
+        K = camera_matrix if camera_matrix is not None else np.eye(3)
+        self.map1, self.map2 = cv2.initUndistortRectifyMap(
+            K, dist_coeffs, self.M @ K, np.eye(3), (self.out_w, self.out_h), cv2.CV_16SC2)
+
+        # Where the camera's centre line (the vehicle) lands in the warped view
+        bottom_centre = cv2.perspectiveTransform(np.float32([[[width / 2, height]]]), self.M)
+        self.vehicle_x = float(bottom_centre[0, 0, 0])
+
+        self._warped = np.empty((self.out_h, self.out_w, 3), dtype=np.uint8)
+
+    def warp(self, frame: np.ndarray) -> np.ndarray:
+        """Top-down view of the frame (buffer reused every call)"""
+        return cv2.remap(frame, self.map1, self.map2, cv2.INTER_LINEAR, dst=self._warped)
+
+    def to_image(self, points: np.ndarray) -> np.ndarray:
+        """Warped-view (N, 2) points back to camera-frame pixels"""
+        return cv2.perspectiveTransform(points.reshape(-1, 1, 2).astype(np.float32), self.M_inv).reshape(-1, 2)
+
+
+@dataclass
+class BirdseyeLanes:
+    """One frame's result; lane fits are x = f(y) in warped pixels"""
+    left: Optional[np.ndarray]
+    right: Optional[np.ndarray]
+    offset_m: Optional[float]       # Vehicle position from lane centre, + = right of centre
+    radius_m: Optional[float]       # Curve radius at the vehicle, None if no lane found
+    left_span: Optional[Tuple[int, int]] = None     # (top, bottom) warped rows the fit's pixels span
+    right_span: Optional[Tuple[int, int]] = None
+
+
+class SlidingWindowDetector:
+    """
+    Lane search in the bird's-eye view
+
+    The thresholded view's non-zero pixels are listed once (row-major, so
+    each window's rows are a contiguous slice found by binary search). The
+    bottom-half column histogram seeds each lane, and n_windows windows step
+    up the image, re-centring on the pixels they catch. Cost is linear in
+    the number of pixels.
+    """
+
+    def __init__(self, warp: BirdseyeWarp, n_windows: int = 9, margin: int = 50,
+                 min_pixels: int = 40, min_lane_pixels: int = 200, timer: Optional[StageTimer] = None):
+        self.warp = warp
+        self.timer = timer or StageTimer()
+        self.n_windows = n_windows
+        self.margin = margin                    # Window half-width in warped pixels
+        self.min_pixels = min_pixels            # Pixels needed to re-centre a window
+        self.min_lane_pixels = min_lane_pixels  # Pixels needed to fit a lane
+
+        self._binary = np.empty((warp.out_h, warp.out_w), dtype=np.uint8)
+        self._sobel = np.empty((warp.out_h, warp.out_w), dtype=np.int16)
+        self._y_eval = warp.out_h - 1
+
+    def threshold(self, warped: np.ndarray) -> np.ndarray:
+        """Lane-marking mask: bright (HLS lightness) or strong vertical edges"""
+        lightness = cv2.extractChannel(cv2.cvtColor(warped, cv2.COLOR_BGR2HLS), 1)
+        cv2.Sobel(lightness, cv2.CV_16S, 1, 0, dst=self._sobel, ksize=3)
+        edges = cv2.convertScaleAbs(self._sobel) > 40
+        # 95th percentile from a 256-bin histogram (np.percentile sorts the whole image)
+        cumulative = np.cumsum(cv2.calcHist([lightness], [0], None, [256], [0, 256]).ravel())
+        bright = lightness > max(160, int(np.searchsorted(cumulative, 0.95 * lightness.size)))
+        np.bitwise_or(edges, bright, out=self._binary.view(bool))
+        return self._binary
+
+    def _follow(self, base_x: int, ys: np.ndarray, xs: np.ndarray, bounds: np.ndarray
+                ) -> Tuple[Optional[np.ndarray], Optional[Tuple[int, int]]]:
+        """Slide windows up from base_x; returns the fitted coefficients and the rows they span, or Nones"""
+        x_current = base_x
+        picked = []
+        # bounds[i]..bounds[i + 1] are the pixel indices in window row band i (bottom first)
+        for i in range(self.n_windows):
+            lo, hi = bounds[i + 1], bounds[i]
+            band_x = xs[lo:hi]
+            inside = np.flatnonzero(np.abs(band_x - x_current) < self.margin) + lo
+            picked.append(inside)
+            if len(inside) >= self.min_pixels:
+                x_current = int(xs[inside].mean())
+
+        idx = np.concatenate(picked)
+        if len(idx) < self.min_lane_pixels:
+            return None, None
+        return np.polyfit(ys[idx], xs[idx], 2), (int(ys[idx].min()), int(ys[idx].max()))
+
+    def detect(self, frame: np.ndarray) -> BirdseyeLanes:
+        warp = self.warp
+        t0 = time.perf_counter()
+        warped = warp.warp(frame)
+        t1 = time.perf_counter()
+        binary = self.threshold(warped)
+        t2 = time.perf_counter()
+
+        ys, xs = np.nonzero(binary)  # Row-major: ys ascending
+        histogram = np.count_nonzero(binary[warp.out_h // 2:], axis=0)
+        mid = warp.out_w // 2
+        bases = (int(np.argmax(histogram[:mid])), mid + int(np.argmax(histogram[mid:])))
+
+        # Window edges from the bottom up, as indices into the sorted ys
+        edges_y = np.linspace(warp.out_h, 0, self.n_windows + 1).astype(int)
+        bounds = np.searchsorted(ys, edges_y)
+
+        (left, left_span), (right, right_span) = (
+            self._follow(b, ys, xs, bounds) if histogram[b] else (None, None) for b in bases)
+        t3 = time.perf_counter()
+
+        self.timer.add('warp', t1 - t0)
+        self.timer.add('threshold', t2 - t1)
+        self.timer.add('windows', t3 - t2)
+        self.timer.frame_done()
+        return BirdseyeLanes(left, right, self._offset(left, right), self._radius(left, right),
+                             left_span, right_span)
+
+    def _offset(self, left, right) -> Optional[float]:
+        if left is None or right is None:
+            return None
+        y = self._y_eval
+        lane_centre = (np.polyval(left, y) + np.polyval(right, y)) / 2
+        return float((self.warp.vehicle_x - lane_centre) * self.warp.xm_per_px)
+
+    def _radius(self, left, right) -> Optional[float]:
+        fits = [f for f in (left, right) if f is not None]
+        if not fits:
+            return None
+        a, b, _ = np.mean(fits, axis=0)
+        # Rescale x = a*y^2 + b*y + c from pixels to metres
+        xm, ym = self.warp.xm_per_px, self.warp.ym_per_px
+        A, B = a * xm / ym ** 2, b * xm / ym
+        y = self._y_eval * ym
+        if abs(A) < 1e-9:
+            return float('inf')
+        return float((1 + (2 * A * y + B) ** 2) ** 1.5 / abs(2 * A))
+
+    def image_curve(self, fit: Optional[np.ndarray], samples: int = 20) -> Optional[np.poly1d]:
+        """Quadratic x = f(y) in camera pixels through a warped-view lane, for drawing/steering"""
+        if fit is None:
+            return None
+        y = np.linspace(0, self.warp.out_h - 1, samples)
+        pts = self.warp.to_image(np.column_stack((np.polyval(fit, y), y)))
+        return np.poly1d(np.polyfit(pts[:, 1], pts[:, 0], 2))
+
+    def image_rows(self, fit: Optional[np.ndarray], span: Optional[Tuple[int, int]]) -> Optional[Tuple[int, int]]:
+        """Camera-frame (top, bottom) rows of a warped-view lane's pixel span"""
+        if fit is None or span is None:
+            return None
+        y = np.array(span, dtype=np.float64)
+        pts = self.warp.to_image(np.column_stack((np.polyval(fit, y), y)))
+        return int(pts[:, 1].min()), int(np.ceil(pts[:, 1].max()))
+
+
+class BirdseyeLaneDetector:
+    """SlidingWindowDetector with the LaneTracker interface: update(frame) -> filtered image-space curves"""
+
+    def __init__(self):
+        self.timer = StageTimer()
+        self.filter = LaneFilter()
+        self.detector: Optional[SlidingWindowDetector] = None
+        self.lanes: Optional[BirdseyeLanes] = None
+
+    def update(self, frame: np.ndarray) -> Tuple[Optional[np.poly1d], Optional[np.poly1d]]:
+        height, width = frame.shape[:2]
+        if self.detector is None or (self.detector.warp.width, self.detector.warp.height) != (width, height):
+            # Remap table is built once per frame size
+            self.detector = SlidingWindowDetector(BirdseyeWarp(width, height), timer=self.timer)
+        lanes = self.lanes = self.detector.detect(frame)
+        detector = self.detector
+        return self.filter.update(height, detector.image_curve(lanes.left), detector.image_curve(lanes.right),
+                                  (detector.image_rows(lanes.left, lanes.left_span),
+                                   detector.image_rows(lanes.right, lanes.right_span)))
+
+    def status(self) -> str:
+        offset = f"{self.lanes.offset_m:+.2f} m" if self.lanes and self.lanes.offset_m is not None else "--"
+        radius = self.lanes.radius_m if self.lanes else None
+        radius = f"{radius:.0f} m" if radius is not None and radius < 5000 else "straight"
+        return f"off {offset}, R {radius}"
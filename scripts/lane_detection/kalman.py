@@ -0,0 +1,260 @@
+"""
+Kalman filtering of lane curves and steering across frames
+
+Each lane's quadratic is filtered in pixel units: x = a*t^2 + b*t + c with
+t = 0 at the bottom row and t = 1 at the top of the ROI, so c is the lane's
+position at the bumper, b its heading and a its curvature. The prediction
+keeps the curvature constant and lets position and heading drift at the
+rate they were last moving, which bridges frames where the detector misses
+a lane. When one lane is gone for good the other is shifted by the last
+measured offset between the lanes instead of guessing a steering value.
+
+A measurement is not the fit's coefficients but its x positions at a few
+rows inside the span the detection actually covered: a quadratic
+extrapolated over rows without lane pixels says little about the lane, and
+gating on it rejects good fits.
+"""
+
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .pipeline import poly_coeffs
+
+# Mahalanobis distance² above which a measurement is an outlier (chi² 3 dof, 99.9%)
+GATE_CHI2 = 16.27
+
+Rows = Tuple[float, float]  # (top, bottom) image rows a lane fit is supported by
+
+
+class LaneKalman:
+    """
+    One lane: state [a, b, c, b_rate, c_rate] in pixels and pixels/frame
+
+    predict() once per frame, then update() with the detector's fit (poly
+    coefficients in image y, plus the rows it covers) or miss() if there was
+    none.
+    """
+
+    # Process noise (std per frame), initial shape uncertainty and measurement noise (std), pixels
+    PROCESS_STD = np.array([0.5, 1.0, 1.0, 0.5, 0.5])
+    INITIAL_STD = np.array([100.0, 60.0, 10.0, 5.0, 5.0])  # A first (Hough) fit is crude away from the bumper
+    MEASUREMENT_STD = 5.0    # Lane x at a covered row
+    MEASUREMENT_ROWS = 3     # Rows sampled across the covered span
+    RATE_DAMPING = 0.9   # Drift rates decay while coasting so a lost lane doesn't run away
+
+    def __init__(self, coeffs: np.ndarray, y_bottom: float, span: float):
+        self.y_bottom, self.span = y_bottom, span
+        # x(y) = T @ [a, b, c] gives the coefficients in image y for t = (y_bottom - y) / span
+        s2 = span * span
+        self._to_image = np.array([
+            [1 / s2, 0, 0],
+            [-2 * y_bottom / s2, -1 / span, 0],
+            [y_bottom * y_bottom / s2, y_bottom / span, 1],
+        ])
+        self._from_image = np.linalg.inv(self._to_image)
+
+        self.F = np.eye(5)
+        self.F[1, 3] = self.F[2, 4] = 1.0            # b += b_rate, c += c_rate; a constant
+        self.F[3, 3] = self.F[4, 4] = self.RATE_DAMPING
+        self.Q = np.diag(self.PROCESS_STD ** 2)
+        self.R = np.eye(self.MEASUREMENT_ROWS) * self.MEASUREMENT_STD ** 2
+
+        self.x = np.zeros(5)
+        self.x[:3] = self._from_image @ coeffs
+        self.P = np.diag(self.INITIAL_STD ** 2)
+        self.misses = 0
+        self.rejections = 0   # Consecutive measurements the gate refused
+
+    @property
+    def shape(self) -> np.ndarray:
+        """[a, b, c] in pixels"""
+        return self.x[:3]
+
+    @property
+    def position_std(self) -> float:
+        """Uncertainty of the lane position at the bottom row, pixels"""
+        return float(np.sqrt(self.P[2, 2]))
+
+    def coeffs(self, shape: Optional[np.ndarray] = None) -> np.ndarray:
+        """Image-space coefficients (np.polyval order) of the filtered lane, or of `shape`"""
+        return self._to_image @ (self.shape if shape is None else shape)
+
+    def predict(self):
+        self.x = self.F @ self.x
+        self.P = self.F @ self.P @ self.F.T + self.Q
+
+    def _observation(self, rows: Optional[Rows]) -> np.ndarray:
+        """H mapping [a, b, c] to lane x at MEASUREMENT_ROWS rows across `rows` (the whole ROI if None)"""
+        t_lo, t_hi = 0.0, 1.0
+        if rows is not None:
+            top, bottom = rows
+            t_lo = min(max((self.y_bottom - bottom) / self.span, 0.0), 1.0)
+            t_hi = min(max((self.y_bottom - top) / self.span, t_lo), 1.0)
+        t = np.linspace(t_lo, t_hi, self.MEASUREMENT_ROWS)
+        return np.column_stack((t * t, t, np.ones_like(t)))
+
+    def update(self, coeffs: np.ndarray, rows: Optional[Rows] = None) -> bool:
+        """Fold in a measured fit covering `rows`; False (and counted as a miss) if it's an outlier"""
+        H = self._observation(rows)
+        innovation = H @ (self._from_image @ coeffs) - H @ self.x[:3]
+        PHt = self.P[:, :3] @ H.T
+        S_inv = np.linalg.inv(H @ PHt[:3] + self.R)
+        if innovation @ S_inv @ innovation > GATE_CHI2:
+            self.rejections += 1
+            self.miss()
+            return False
+
+        K = PHt @ S_inv
+        self.x = self.x + K @ innovation
+        # Joseph form: stays symmetric positive definite where P - K H P loses it to rounding
+        I_KH = np.eye(5)
+        I_KH[:, :3] -= K @ H
+        self.P = I_KH @ self.P @ I_KH.T + K @ self.R @ K.T
+        self.misses = 0
+        self.rejections = 0
+        return True
+
+    def miss(self):
+        self.misses += 1
+
+
+class LaneFilter:
+    """
+    Kalman filters for the left/right lanes plus the offset between them
+
+    Lanes are dropped after max_coast frames without a measurement or once
+    their position is too uncertain for a strip search to find them again. A
+    lane whose measurements fail the gate max_rejections times in a row is
+    restarted from the latest one: the track, not the detector, is wrong.
+    """
+
+    def __init__(self, roi_top: float = 0.4, max_coast: int = 10, max_position_std: float = 20.0,
+                 width_smoothing: float = 0.1, max_rejections: int = 3):
+        self.roi_top = roi_top
+        self.max_coast = max_coast
+        self.max_position_std = max_position_std
+        self.width_smoothing = width_smoothing
+        self.max_rejections = max_rejections
+        self.measured = 0   # Fits offered to tracked lanes
+        self.rejected = 0   # ...and refused by the gate
+
+        self.lanes: Dict[str, Optional[LaneKalman]] = {'left': None, 'right': None}
+        self.lane_offset: Optional[np.ndarray] = None   # right - left [a, b, c] while both are seen
+        self.height = None
+
+    def predict(self, height: int):
+        """Advance both lanes one frame; called once per frame before correct()"""
+        if height != self.height:
+            self.lanes = {'left': None, 'right': None}
+            self.lane_offset = None
+            self.height = height
+
+        left, right = self.lanes['left'], self.lanes['right']
+        if left is not None and right is not None and left.misses == 0 and right.misses == 0:
+            # Both lanes were measured last frame
+            offset = right.shape - left.shape
+            self.lane_offset = offset if self.lane_offset is None else \
+                (1 - self.width_smoothing) * self.lane_offset + self.width_smoothing * offset
+
+        for lane in self.lanes.values():
+            if lane is not None:
+                lane.predict()
+
+    def prior(self, side: str) -> Optional[np.ndarray]:
+        """Predicted image-space coefficients of a lane, or None if it isn't tracked"""
+        lane = self.lanes[side]
+        return lane.coeffs() if lane is not None else None
+
+    def missing(self) -> bool:
+        return self.lanes['left'] is None or self.lanes['right'] is None
+
+    def _start(self, side: str, coeffs: np.ndarray):
+        y_bottom = self.height - 1
+        self.lanes[side] = LaneKalman(coeffs, y_bottom, y_bottom - self.height * self.roi_top)
+
+    def correct(self, side: str, coeffs: Optional[np.ndarray], rows: Optional[Rows] = None) -> bool:
+        """
+        Measurement (or None) for one lane, fitted over image rows `rows`
+
+        Starts tracking an untracked lane. True if the measurement was used.
+        """
+        lane = self.lanes[side]
+        if lane is None:
+            if coeffs is not None:
+                self._start(side, coeffs)
+            return coeffs is not None
+
+        if coeffs is None:
+            lane.miss()
+        else:
+            self.measured += 1
+            if lane.update(coeffs, rows):
+                return True
+            self.rejected += 1
+            if lane.rejections >= self.max_rejections:
+                self._start(side, coeffs)
+                return True
+        if lane.misses > self.max_coast or lane.position_std > self.max_position_std:
+            self.lanes[side] = None
+        return False
+
+    def update(self, height: int, left: Optional[np.poly1d], right: Optional[np.poly1d],
+               rows: Tuple[Optional[Rows], Optional[Rows]] = (None, None)
+               ) -> Tuple[Optional[np.poly1d], Optional[np.poly1d]]:
+        """predict() + correct() both lanes with a detector's curves (and the rows each covers); returns curves()"""
+        self.predict(height)
+        for side, curve, curve_rows in zip(('left', 'right'), (left, right), rows):
+            self.correct(side, None if curve is None else poly_coeffs(curve), curve_rows)
+        return self.curves()
+
+    def curves(self) -> Tuple[Optional[np.poly1d], Optional[np.poly1d]]:
+        """Filtered (left, right); a lost lane is the other one shifted by the last lane offset"""
+        left, right = self.lanes['left'], self.lanes['right']
+        if left is not None and right is not None:
+            return np.poly1d(left.coeffs()), np.poly1d(right.coeffs())
+
+        if self.lane_offset is None:
+            return tuple(np.poly1d(lane.coeffs()) if lane is not None else None for lane in (left, right))
+        if left is not None:
+            return np.poly1d(left.coeffs()), np.poly1d(left.coeffs(left.shape + self.lane_offset))
+        if right is not None:
+            return np.poly1d(right.coeffs(right.shape - self.lane_offset)), np.poly1d(right.coeffs())
+        return None, None
+
+
+class SteeringFilter:
+    """
+    Scalar Kalman filter (random walk) over the steering command: O(1) per frame
+
+    Without a measurement the estimate is held for max_coast frames (the
+    lane filter has already bridged short dropouts by then), after which it
+    decays to exactly 0 so a lost detection never keeps commanding torque.
+    """
+
+    def __init__(self, process_var: float = 1e-3, measurement_var: float = 1e-2,
+                 max_coast: int = 5, decay: float = 0.7):
+        self.q = process_var
+        self.r = measurement_var
+        self.max_coast = max_coast
+        self.decay = decay
+        self.value = 0.0
+        self.p = 1.0
+        self.misses = 0
+
+    def update(self, measurement: Optional[float]) -> float:
+        """Filtered steering; with no measurement held, then decayed to 0 after max_coast frames"""
+        self.p += self.q
+        if measurement is None:
+            self.misses += 1
+            if self.misses > self.max_coast:
+                self.value *= self.decay
+                if abs(self.value) < 1e-3:
+                    self.value = 0.0
+            return self.value
+
+        self.misses = 0
+        k = self.p / (self.p + self.r)
+        self.value += k * (measurement - self.value)
+        self.p *= 1 - k
+        return self.value
@@ -0,0 +1,131 @@
+"""
+Multi-resolution lane detection that adapts to a per-frame time budget
+
+Lane candidates come from the Hough pipeline run on a downscaled ROI (1/2 or
+1/4 per side, i.e. 1/4 or 1/16 of the pixels). Each candidate curve is then
+refit at full resolution by a StripSearch, so the coarse pass only has to
+find roughly where the lanes are. A LevelController measures every frame and
+steps between quality levels to keep detection inside the budget; on a slow
+CPU (Pi 4) accuracy degrades gracefully instead of frames being dropped.
+"""
+
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .kalman import LaneFilter
+from .pipeline import IMPROVED, LanePipeline, PipelineConfig, StageTimer, poly_coeffs
+from .tracker import StripSearch
+
+
+@dataclass(frozen=True)
+class PyramidLevel:
+    scale: int      # Downscale factor of the candidate search (1 = full resolution)
+    refine: bool    # Refit the candidate curves at full resolution
+
+
+# Finest (slowest) first
+LEVELS = (
+    PyramidLevel(1, refine=False),  # Full-resolution Hough is already exact
+    PyramidLevel(2, refine=True),
+    PyramidLevel(4, refine=True),
+    PyramidLevel(4, refine=False),  # Last resort: coarse curves as they are
+)
+
+
+class LevelController:
+    """
+    Picks the finest level whose measured cost fits the budget
+
+    Cost per level is an exponential average of the measured detection time.
+    A level over budget steps one coarser right away; a finer level is only
+    tried again when its cost (or, if never measured, the current cost times
+    finer_ratio) fits with headroom to spare. Finer costs are forgotten every
+    probe_interval frames so a one-off slow frame doesn't pin a coarse level.
+    """
+
+    def __init__(self, budget_s: float, n_levels: int = len(LEVELS), alpha: float = 0.2,
+                 headroom: float = 0.8, finer_ratio: float = 2.0, probe_interval: int = 100):
+        self.budget_s = budget_s
+        self.alpha = alpha
+        self.headroom = headroom
+        self.finer_ratio = finer_ratio
+        self.probe_interval = probe_interval
+
+        self.costs: List[Optional[float]] = [None] * n_levels
+        self.level = 0
+        self.frames_at_level = 0
+        self.switches = 0
+
+    def _estimate(self, level: int) -> float:
+        cost = self.costs[level]
+        return cost if cost is not None else self.costs[level + 1] * self.finer_ratio
+
+    def record(self, seconds: float) -> int:
+        """Account one frame's detection time; returns the level for the next frame"""
+        cost = self.costs[self.level]
+        self.costs[self.level] = seconds if cost is None else (1 - self.alpha) * cost + self.alpha * seconds
+        self.frames_at_level += 1
+
+        if self.frames_at_level % self.probe_interval == 0:
+            self.costs[:self.level] = [None] * self.level
+
+        if self.costs[self.level] > self.budget_s and self.level < len(self.costs) - 1:
+            self._switch(self.level + 1)
+        elif self.level > 0 and self._estimate(self.level - 1) < self.headroom * self.budget_s:
+            self._switch(self.level - 1)
+        return self.level
+
+    def _switch(self, level: int):
+        self.level = level
+        self.frames_at_level = 0
+        self.switches += 1
+
+
+class PyramidLaneDetector:
+    """Coarse Hough + full-resolution refit, with the LaneTracker interface: update(frame) -> filtered curves"""
+
+    def __init__(self, budget_s: float, config: PipelineConfig = IMPROVED,
+                 levels: Sequence[PyramidLevel] = LEVELS, margin: int = 40):
+        self.levels = tuple(levels)
+        self.timer = StageTimer()
+        self.controller = LevelController(budget_s, len(self.levels))
+        self.strip = StripSearch(margin)
+        self.filter = LaneFilter(config.roi_top)
+
+        # One pipeline per scale; levels that share a scale share its pipeline
+        self.pipelines = {level.scale: LanePipeline(config, self.timer, scale=level.scale) for level in self.levels}
+        self.refined = 0
+
+    @property
+    def level(self) -> PyramidLevel:
+        return self.levels[self.controller.level]
+
+    def update(self, frame: np.ndarray) -> Tuple[Optional[np.poly1d], Optional[np.poly1d]]:
+        t0 = time.perf_counter()
+        level = self.level
+        pipeline = self.pipelines[level.scale]
+        result = pipeline.run(frame, count_frame=False)
+        curves = [result.left, result.right]
+        rows = [result.left_rows, result.right_rows]
+
+        if level.refine:
+            t1 = time.perf_counter()
+            ys = np.arange(pipeline.roi_offset(frame.shape[0]), frame.shape[0])
+            for i, curve in enumerate(curves):
+                if curve is None:
+                    continue
+                found = self.strip.search(frame, poly_coeffs(curve), ys)
+                if found is not None:  # Otherwise the coarse curve stands
+                    curves[i], rows[i] = np.poly1d(found[0]), found[1]
+                    self.refined += 1
+            self.timer.add('refine', time.perf_counter() - t1)
+
+        self.controller.record(time.perf_counter() - t0)
+        self.timer.frame_done()
+        return self.filter.update(frame.shape[0], curves[0], curves[1], rows)
+
+    def status(self) -> str:
+        return f"1/{self.level.scale}{' + refine' if self.level.refine else ''}"
@@ -0,0 +1,121 @@
+"""
+Frame-to-frame lane tracking around the previous curves
+
+The full pipeline (Hough over the whole ROI) only runs to acquire a lane;
+after that each lane is refit from a narrow strip around its predicted curve.
+"""
+
+import time
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .kalman import LaneFilter
+from .pipeline import IMPROVED, LanePipeline, PipelineConfig, StageTimer, poly_coeffs
+
+
+class StripSearch:
+    """
+    Full-resolution lane refit inside a narrow strip around a known curve
+
+    The strip is gathered into a small image (one row per frame row, so the
+    lane stays roughly vertical in it), edge-detected, and its edge pixels
+    refit. Cost scales with the strip, not the frame.
+    """
+
+    def __init__(self, margin: int = 40, min_points: int = 40, min_coverage: float = 0.3):
+        self.margin = margin              # Strip half-width in pixels
+        self.min_points = min_points      # Edge pixels needed to accept a fit
+        self.min_coverage = min_coverage  # Fraction of the ROI height the edges must span
+
+        self._offsets = np.arange(-margin, margin)
+        # Created once; tiles only along the strip's height
+        self._clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(1, 8))
+
+    def search(self, frame: np.ndarray, coeffs: np.ndarray, ys: np.ndarray
+               ) -> Optional[Tuple[np.ndarray, Tuple[int, int]]]:
+        """
+        Refit one lane from the edges near the curve `coeffs`
+
+        Returns the fit and the (top, bottom) rows its edges span, or None if
+        the lane wasn't found.
+        """
+        width = frame.shape[1]
+        previous_x = np.polyval(coeffs, ys)
+        cols = np.rint(previous_x).astype(np.int32)[:, None] + self._offsets
+        inside = (cols >= 0) & (cols < width)
+
+        # remap gathers the strip much faster than numpy fancy indexing
+        map_x = cols.astype(np.float32)
+        map_y = np.broadcast_to(ys[:, None], cols.shape).astype(np.float32)
+        strip = cv2.remap(frame, map_x, map_y, cv2.INTER_NEAREST, borderMode=cv2.BORDER_REPLICATE)
+        l_channel = cv2.extractChannel(cv2.cvtColor(strip, cv2.COLOR_BGR2HLS), 1)
+        blur = cv2.GaussianBlur(self._clahe.apply(l_channel), (7, 7), 0)
+        edges = cv2.Canny(blur, 30, 100)
+        edges[~inside] = 0  # Columns past the frame edge are replicated border pixels
+
+        rows, strip_cols = np.nonzero(edges)
+        if len(rows) < self.min_points or np.ptp(rows) < self.min_coverage * len(ys):
+            return None
+
+        fit = np.polyfit(ys[rows], cols[rows, strip_cols], 2)
+        # A fit that wandered off the strip latched onto something else
+        if np.mean(np.abs(np.polyval(fit, ys) - previous_x)) > self.margin:
+            return None
+        return fit, (int(ys[rows[0]]), int(ys[rows[-1]]))  # nonzero() lists rows in order
+
+
+class LaneTracker:
+    """
+    Follows the left/right lane curves from frame to frame
+
+    Each lane is a LaneKalman: its prediction for this frame centres a
+    StripSearch, and the strip's fit is the measurement. A lane the strip
+    misses coasts on the prediction, so the full-ROI pipeline only runs to
+    (re)acquire a lane that went max_misses frames without a strip fit.
+    """
+
+    def __init__(self, config: PipelineConfig = IMPROVED, margin: int = 40, min_points: int = 40,
+                 min_coverage: float = 0.3, max_misses: int = 10):
+        self.timer = StageTimer()
+        self.pipeline = LanePipeline(config, self.timer)
+        self.strip = StripSearch(margin, min_points, min_coverage)
+        # A lane is dropped after max_misses frames in a row without a strip fit; the position
+        # bound is only a backstop for a lane that can no longer be inside the strip at all
+        self.filter = LaneFilter(config.roi_top, max_coast=max_misses, max_position_std=margin)
+        self.full_searches = 0
+
+    def curves(self) -> Tuple[Optional[np.poly1d], Optional[np.poly1d]]:
+        return self.filter.curves()
+
+    def update(self, frame: np.ndarray) -> Tuple[Optional[np.poly1d], Optional[np.poly1d]]:
+        """Track both lanes in a new frame; returns (left_curve, right_curve) as np.poly1d or None"""
+        t0 = time.perf_counter()
+        ys = np.arange(self.pipeline.roi_offset(frame.shape[0]), frame.shape[0])
+        self.filter.predict(frame.shape[0])
+
+        for side in ('left', 'right'):
+            prior = self.filter.prior(side)
+            if prior is not None:
+                found = self.strip.search(frame, prior, ys)
+                if found is None:
+                    self.filter.correct(side, None)
+                else:
+                    self.filter.correct(side, *found)
+        self.timer.add('track', time.perf_counter() - t0)
+
+        # Full search only for lanes the filter has dropped
+        if self.filter.missing():
+            self.full_searches += 1
+            result = self.pipeline.run(frame, count_frame=False)
+            for side, curve, rows in (('left', result.left, result.left_rows),
+                                      ('right', result.right, result.right_rows)):
+                if self.filter.prior(side) is None and curve is not None:
+                    self.filter.correct(side, poly_coeffs(curve), rows)
+
+        self.timer.frame_done()
+        return self.curves()
+
+    def status(self) -> str:
+        return f"{self.full_searches} full Hough"
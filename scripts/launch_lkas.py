@@ -35,6 +35,10 @@ except ImportError as e:
     messaging = None
     Params = None
 
+# V4L2 capability cache shared with the patched camera.py
+sys.path.insert(0, str(PROJECT_ROOT / "vm-archive" / "openpilot-patches"))
+import v4l2_caps
+
 # Process definitions
 class Process:
     def __init__(
@@ -146,32 +150,47 @@ class LKASLauncher:
         with_ui: bool = True,
         include_webcam: bool = True,
         bridge_only: bool = False,
+        rescan_cameras: bool = False,
     ):
         self.bridge_path = bridge_path
         self.config_path = config_path
         self.with_ui = with_ui
         self.include_webcam = include_webcam
         self.bridge_only = bridge_only
+        self.rescan_cameras = rescan_cameras
         self.processes: List[Process] = []
         self.running = False
+        self._cameras: Optional[Dict[str, dict]] = None
         
         # Define processes in dependency order
         self.define_processes()
     
+    def discover_cameras(self) -> Dict[str, dict]:
+        """Capture-capable video devices and their modes (queried once, cached on disk)"""
+        if self._cameras is None:
+            try:
+                self._cameras = v4l2_caps.discover(refresh=self.rescan_cameras)
+            except OSError as e:
+                print(f"⚠ Could not query video devices: {e}")
+                self._cameras = {}
+        return self._cameras
+    
+    def select_camera(self) -> Optional[str]:
+        """First device that can do the capture mode camera.py wants, else the first capture device"""
+        cameras = self.discover_cameras()
+        for path, caps in cameras.items():
+            if v4l2_caps.best_mode(caps['modes']) is not None:
+                return path
+        return next(iter(cameras), None)
+    
     def define_processes(self):
         """Define all processes needed for LKAS"""
         
         # 1. Webcamerad - Camera capture (USB webcam)
         if self.include_webcam:
-            # Auto-detect first available video device
-            video_num = "0"
-            try:
-                for i in range(10):
-                    if Path(f"/dev/video{i}").exists():
-                        video_num = str(i)
-                        break
-            except Exception:
-                video_num = "0"
+            # Best capture device from the V4L2 capability cache
+            device = self.select_camera()
+            video_num = device[len("/dev/video"):] if device else "0"
             
             self.processes.append(Process(
                 name="webcamerad",
@@ -294,10 +313,18 @@ class LKASLauncher:
         
         # Check webcam
         if self.include_webcam:
-            webcam_devices = [Path(f"/dev/video{i}") for i in range(10)]
-            webcam_found = [w for w in webcam_devices if w.exists()]
-            if webcam_found:
-                print(f"✓ Webcam detected: {', '.join(str(w) for w in webcam_found)}")
+            cameras = self.discover_cameras()
+            if cameras:
+                print(f"✓ Webcam detected: {', '.join(cameras)}")
+                device = self.select_camera()
+                caps = cameras[device]
+                mode = caps.get('selected') or v4l2_caps.best_mode(caps['modes'])
+                if mode:
+                    print(f"  Using {device} ({caps['card']}): {mode['fourcc']} "
+                          f"{mode['width']}x{mode['height']} @ {mode['fps']:g} fps")
+                else:
+                    print(f"  ⚠ {device} ({caps['card']}) has no {v4l2_caps.DEFAULT_SIZE[0]}x{v4l2_caps.DEFAULT_SIZE[1]} "
+                          f"mode at {v4l2_caps.DEFAULT_MIN_FPS:g}+ fps, camerad will negotiate")
             else:
                 print("⚠ Warning: No webcam found")
                 print("  System will start but won't receive camera frames")
@@ -422,6 +449,7 @@ def main():
     parser.add_argument("--no-ui", action="store_true", help="Run without UI (headless mode)")
     parser.add_argument("--bridge-only", action="store_true", help="Run only the bridge (assumes openpilot already running)")
     parser.add_argument("--external-webcam", action="store_true", help="Skip launching webcamerad (start it manually)")
+    parser.add_argument("--rescan-cameras", action="store_true", help="Re-query webcam capabilities instead of using the cache")
     args = parser.parse_args()
     
     # Paths
@@ -437,6 +465,7 @@ def main():
         with_ui=with_ui,
         include_webcam=not args.external_webcam,
         bridge_only=args.bridge_only,
+        rescan_cameras=args.rescan_cameras,
     )
     
     # Run
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Calibrated projection of modelV2 points into the displayed camera image
+
+modelV2 lane lines and path are in openpilot's calibrated frame (x forward,
+y right, z down, metres). ModelProjector folds the camera intrinsics, the
+device -> view axis swap and the liveCalibration rotation into one 3x3
+matrix, rebuilt only when the calibration changes, so projecting a whole
+(N, 3) point array is one matrix product. This is the transform openpilot's
+UI uses (calib_frame_to_full_frame).
+
+    projector = ModelProjector((1280, 720), camera_size=(reader.width, reader.height))
+    if sm.updated['liveCalibration']:
+        projector.update_calibration(sm['liveCalibration'])
+    pts = projector.project(np.column_stack((line.x, line.y, line.z)))
+    cv2.polylines(frame, [pts], False, color, 3)
+"""
+
+import numpy as np
+
+WEBCAM_FOCAL_PX = 908.0     # At the capture resolution, as in the camera patch
+DEFAULT_HEIGHT_M = 1.22     # Camera height above the road until liveCalibration reports one
+MIN_DEPTH_M = 0.5           # Points closer than this (or behind the camera) are dropped
+
+# Device frame (x forward, y right, z down) -> camera view frame (x right, y down, z forward)
+VIEW_FROM_DEVICE = np.array([
+    [0.0, 1.0, 0.0],
+    [0.0, 0.0, 1.0],
+    [1.0, 0.0, 0.0],
+])
+
+
+def rot_from_euler(roll, pitch, yaw):
+    """Rotation matrix for roll/pitch/yaw about x/y/z, applied in that order (openpilot's convention)"""
+    cr, sr = np.cos(roll), np.sin(roll)
+    cp, sp = np.cos(pitch), np.sin(pitch)
+    cy, sy = np.cos(yaw), np.sin(yaw)
+    rx = np.array([[1, 0, 0], [0, cr, -sr], [0, sr, cr]])
+    ry = np.array([[cp, 0, sp], [0, 1, 0], [-sp, 0, cp]])
+    rz = np.array([[cy, -sy, 0], [sy, cy, 0], [0, 0, 1]])
+    return rz @ ry @ rx
+
+
+class ModelProjector:
+    """Calibrated-frame points -> display pixels through one cached matrix"""
+
+    def __init__(self, display_size, camera_size=None, focal_px=WEBCAM_FOCAL_PX):
+        self.display_size = display_size
+        self.camera_size = camera_size or display_size
+        self.focal_px = focal_px
+
+        self.rpy = (0.0, 0.0, 0.0)
+        self.height = DEFAULT_HEIGHT_M
+        self.transform = None
+        self._rebuild()
+
+    def set_camera_size(self, width, height):
+        """Resolution camerad publishes (the focal length is given at this size)"""
+        if (width, height) != self.camera_size:
+            self.camera_size = (width, height)
+            self._rebuild()
+
+    def update_calibration(self, calibration):
+        """Take rpyCalib/height from a liveCalibration message; True if the projection changed"""
+        rpy = tuple(calibration.rpyCalib)
+        if len(rpy) != 3:
+            return False  # Not calibrated yet
+        heights = getattr(calibration, 'height', ())  # Only in newer openpilot
+        height = heights[0] if len(heights) else self.height
+
+        if rpy == self.rpy and height == self.height:
+            return False
+        self.rpy, self.height = rpy, height
+        self._rebuild()
+        return True
+
+    def _rebuild(self):
+        (dw, dh), (cw, ch) = self.display_size, self.camera_size
+        # Intrinsics of the camera image scaled to the display
+        sx, sy = dw / cw, dh / ch
+        intrinsics = np.array([
+            [self.focal_px * sx, 0.0, dw / 2],
+            [0.0, self.focal_px * sy, dh / 2],
+            [0.0, 0.0, 1.0],
+        ])
+        self.transform = intrinsics @ VIEW_FROM_DEVICE @ rot_from_euler(*self.rpy)
+
+    def project(self, points, z_offset=0.0):
+        """
+        (M, 2) int32 display pixels for the points in front of the camera
+
+        points is (N, 3) x/y/z, or (N, 2) x/y on the road surface. z_offset is
+        added to z, e.g. the camera height for modelV2.position, which is at
+        device height rather than on the road.
+        """
+        points = np.asarray(points, dtype=np.float64)
+        if points.shape[1] == 2:
+            z = np.full((len(points), 1), self.height)
+            points = np.hstack((points, z))
+        elif z_offset:
+            points = points + (0.0, 0.0, z_offset)
+
+        projected = points @ self.transform.T
+        depth = projected[:, 2]
+        front = depth > MIN_DEPTH_M
+        pixels = projected[front, :2] / depth[front, None]
+
+        # Far off-screen points are pulled in so int32 can't overflow; cv2.polylines clips the rest
+        w, h = self.display_size
+        np.clip(pixels, (-w, -h), (2 * w, 2 * h), out=pixels)
+        return np.rint(pixels).astype(np.int32)
@@ -7,14 +7,19 @@ Displays webcam feed with lane overlays from openpilot modelV2 output
 import cv2
 import numpy as np
 import cereal.messaging as messaging
+import argparse
 import time
 import math
 
+from model_projection import ModelProjector
+from overlay_layers import OverlayLayer, color
+from vision_frames import VisionFrameReader, lower_priority
+
 class OpenpilotViewer:
     def __init__(self):
         """Initialize viewer with cereal subscribers"""
         # Subscribe to both model output and camera frames
-        self.sm = messaging.SubMaster(['modelV2', 'roadCameraState', 'roadEncodeIdx'])
+        self.sm = messaging.SubMaster(['modelV2', 'liveCalibration', 'roadCameraState', 'roadEncodeIdx'])
         
         # Display settings (720p)
         self.width = 1280
@@ -22,8 +27,11 @@ class OpenpilotViewer:
         self.display_width = 1280
         self.display_height = 720
         
-        # Camera frame
-        self.last_camera_frame = None
+        # Camera frames from camerad's VisionIPC buffers (shared with webcam_lkas_viewer)
+        self.reader = None
+        
+        # Model -> image projection, rebuilt only when liveCalibration changes
+        self.projector = ModelProjector((self.display_width, self.display_height))
         
         # Colors (BGR format for OpenCV)
         self.lane_color = (0, 255, 255)      # Yellow for lanes
@@ -36,6 +44,13 @@ class OpenpilotViewer:
         self.last_fps_time = time.time()
         self.fps = 0.0
         
+        # Cached overlays: lanes/path redrawn per modelV2 message, HUD when its text changes
+        self.model_layer = OverlayLayer((self.display_width, self.display_height))
+        self.hud_layer = OverlayLayer((self.display_width, self.display_height))
+        self.steer_text = None
+        self.lane_text = None
+        self.error_text = None
+        
         print("\n" + "="*70)
         print("  🎥 OPENPILOT LANE DETECTION VIEWER")
         print("="*70)
@@ -46,65 +61,34 @@ class OpenpilotViewer:
         print("    Space - Pause/Resume")
         print("\n" + "="*70 + "\n")
     
-    def model_to_image_coords(self, x, y, z=0):
-        """Convert model coordinates (meters) to image pixel coordinates
-        Model uses road plane coordinates, we need to project to camera image.
-        x = forward distance, y = lateral offset, z = height
+    def model_to_image_coords(self, points, z_offset=0.0):
+        """Convert model points (meters, (N, 2) or (N, 3)) to image pixel coordinates
+        Model uses the calibrated frame: x = forward distance, y = lateral offset, z = down.
+        Returns (M, 2) int32 pixels of the points in front of the camera.
         """
-        # Camera calibration approximation for forward-facing dashcam
-        # These values work reasonably for typical dashcam mounting
-        focal_length = 910  # pixels (approximate for 720p)
-        camera_height = 1.22  # meters (typical car camera height)
-        
-        # Simple perspective projection
-        if x > 0.1:  # Avoid division by zero
-            # Project onto image plane
-            # Lateral position
-            pixel_x = int(self.display_width / 2 + (y * focal_length) / x)
-            # Vertical position (road surface to image)
-            pixel_y = int(self.display_height / 2 + (focal_length * (z - camera_height)) / x + self.display_height * 0.1)
-            
-            return (pixel_x, pixel_y)
-        else:
-            return (self.display_width // 2, self.display_height)  # Bottom center for close points
+        return self.projector.project(points, z_offset)
     
     def draw_lane_line(self, frame, points, color, thickness=3):
         """Draw a lane line from model points"""
         if len(points) < 2:
             return
         
-        # Convert model points to image coordinates
-        image_points = []
-        for x, y in points:
-            px, py = self.model_to_image_coords(x, y)
-            # Only draw points that are visible in the frame
-            if 0 <= px < self.display_width and 0 <= py < self.display_height:
-                image_points.append((px, py))
-        
-        # Draw line segments
+        image_points = self.model_to_image_coords(points)
         if len(image_points) >= 2:
-            for i in range(len(image_points) - 1):
-                cv2.line(frame, image_points[i], image_points[i+1], color, thickness)
+            cv2.polylines(frame, [image_points], False, color, thickness)
     
     def draw_path(self, frame, points):
         """Draw the planned path"""
         if len(points) < 2:
             return
         
-        # Convert and draw path
-        image_points = []
-        for x, y in points:
-            px, py = self.model_to_image_coords(x, y)
-            if 0 <= px < self.display_width and 0 <= py < self.display_height:
-                image_points.append((px, py))
-        
-        # Draw thicker path line
+        # The path is at camera height, not on the road
+        image_points = self.model_to_image_coords(points, z_offset=self.projector.height)
         if len(image_points) >= 2:
-            for i in range(len(image_points) - 1):
-                cv2.line(frame, image_points[i], image_points[i+1], self.path_color, 5)
+            cv2.polylines(frame, [image_points], False, color(self.path_color), 5)
     
-    def draw_overlay(self, frame, modelV2):
-        """Draw lane lines and path on frame"""
+    def draw_overlay(self, canvas, modelV2):
+        """Draw lane lines and path into the model layer; keeps the HUD text for draw_hud"""
         try:
             # Get lane lines
             lane_lines = modelV2.laneLines
@@ -113,71 +97,62 @@ class OpenpilotViewer:
             # Draw each lane line (left to right)
             for i, (line, prob) in enumerate(zip(lane_lines, lane_line_probs)):
                 if prob > 0.3:  # Only draw if confident
-                    # Extract points
-                    points = []
-                    for j in range(len(line.x)):
-                        x = line.x[j]  # Forward distance
-                        y = line.y[j]  # Lateral offset
-                        points.append((x, y))
-                    
-                    # Draw lane line
-                    self.draw_lane_line(frame, points, self.lane_color)
+                    # Forward distance, lateral offset, depth below the camera
+                    points = np.column_stack((line.x, line.y, line.z))
+                    self.draw_lane_line(canvas, points, color(self.lane_color))
             
             # Draw the planned path (center of lane)
             position = modelV2.position
-            path_points = []
-            for j in range(len(position.x)):
-                x = position.x[j]
-                y = position.y[j]
-                path_points.append((x, y))
+            path_points = np.column_stack((position.x, position.y, position.z))
             
-            self.draw_path(frame, path_points)
+            self.draw_path(canvas, path_points)
             
             # Calculate steering angle from path
+            self.steer_text = None
             if len(path_points) >= 10:
                 # Use point ~10m ahead (index around 10-15)
                 lookahead_idx = min(15, len(path_points) - 1)
-                x_ahead = position.x[lookahead_idx]
-                y_ahead = position.y[lookahead_idx]
+                x_ahead, y_ahead = path_points[lookahead_idx, :2]
                 
                 if x_ahead > 0:
                     steer_rad = math.atan2(y_ahead, x_ahead)
                     steer_deg = math.degrees(steer_rad)
                     
-                    # Draw steering indicator
+                    # Steering indicator
                     direction = "LEFT" if steer_deg < -1 else "RIGHT" if steer_deg > 1 else "STRAIGHT"
-                    steer_text = f"Steer: {steer_deg:+.1f}° {direction}"
-                    cv2.putText(frame, steer_text, (20, 80), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 1.0, self.text_color, 2)
+                    self.steer_text = f"Steer: {steer_deg:+.1f}° {direction}"
             
             # Count confident lane lines
             num_lanes = sum(1 for prob in lane_line_probs if prob > 0.3)
-            lane_text = f"Lanes detected: {num_lanes}"
-            cv2.putText(frame, lane_text, (20, 120), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.8, self.text_color, 2)
+            self.lane_text = f"Lanes detected: {num_lanes}"
+            self.error_text = None
             
         except Exception as e:
-            cv2.putText(frame, f"Error: {str(e)[:50]}", (20, 160),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 1)
+            self.error_text = f"Error: {str(e)[:50]}"
     
-    def get_camera_frame(self):
-        """Get the latest camera frame from openpilot"""
-        # Try to read from shared memory or messaging
-        # For now, capture directly from webcam as fallback
-        if not hasattr(self, 'cap'):
-            # Initialize webcam capture
-            self.cap = cv2.VideoCapture(0)
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
-            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
-        
-        ret, frame = self.cap.read()
-        if ret:
-            return frame
-        return None
+    def draw_hud(self, canvas):
+        """Draw the status text into the HUD layer"""
+        cv2.putText(canvas, f"FPS: {self.fps:.1f}", (20, 40),
+                   cv2.FONT_HERSHEY_SIMPLEX, 1.0, color(self.text_color), 2)
+        if self.steer_text:
+            cv2.putText(canvas, self.steer_text, (20, 80), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 1.0, color(self.text_color), 2)
+        if self.lane_text:
+            cv2.putText(canvas, self.lane_text, (20, 120), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.8, color(self.text_color), 2)
+        if self.error_text:
+            cv2.putText(canvas, self.error_text, (20, 160),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, color((0, 0, 255)), 1)
     
-    def run(self):
+    def run(self, display_hz=10.0):
         """Main viewer loop"""
+        self.reader = VisionFrameReader((self.display_width, self.display_height), display_hz)
+        if not self.reader.connect():
+            print("⏳ Waiting for camerad...")
+            self.reader.connect(True)
+        print(f"✓ Camera: {self.reader.width}x{self.reader.height}, display at {display_hz:.0f} Hz\n")
+        self.projector.set_camera_size(self.reader.width, self.reader.height)
+        
         cv2.namedWindow('Openpilot Lane Detection', cv2.WINDOW_NORMAL)
         cv2.resizeWindow('Openpilot Lane Detection', self.display_width, self.display_height)
         
@@ -185,71 +160,67 @@ class OpenpilotViewer:
         last_frame = None
         
         while True:
-            # Update subscribers
-            self.sm.update(100)  # 100ms timeout
+            # Get camera frame (None until the next display refresh is due)
+            frame = None if paused else self.reader.read()
             
-            if not paused:
-                # Get camera frame
-                frame = self.get_camera_frame()
+            if frame is not None:
+                # Update subscribers (non-blocking; the loop is paced by the display rate)
+                self.sm.update(0)
+                if self.sm.updated['liveCalibration']:
+                    self.projector.update_calibration(self.sm['liveCalibration'])
                 
-                if frame is None:
-                    # No camera - create blank frame
-                    frame = np.zeros((self.display_height, self.display_width, 3), dtype=np.uint8)
-                    cv2.putText(frame, "No camera feed", 
-                               (self.display_width // 2 - 150, self.display_height // 2),
-                               cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 255), 2)
-                else:
-                    # Resize if needed
-                    if frame.shape[1] != self.display_width or frame.shape[0] != self.display_height:
-                        frame = cv2.resize(frame, (self.display_width, self.display_height))
-                
-                # Draw lane overlays if we have model data
+                # Re-rasterize the lane overlay only when there is new model data
                 if self.sm.updated['modelV2']:
                     modelV2 = self.sm['modelV2']
-                    self.draw_overlay(frame, modelV2)
+                    self.model_layer.update(lambda canvas: self.draw_overlay(canvas, modelV2))
                     self.frame_count += 1
                 
-                last_frame = frame.copy()
-            else:
-                # Paused - show last frame
-                if last_frame is not None:
-                    frame = last_frame.copy()
-                    cv2.putText(frame, "PAUSED", (self.display_width // 2 - 100, 50),
-                               cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 165, 255), 3)
-                else:
-                    frame = np.zeros((self.display_height, self.display_width, 3), dtype=np.uint8)
-            
-            # Calculate FPS
-            current_time = time.time()
-            if current_time - self.last_fps_time >= 1.0:
-                self.fps = self.frame_count / (current_time - self.last_fps_time)
-                self.frame_count = 0
-                self.last_fps_time = current_time
-            
-            # Draw status
-            cv2.putText(frame, f"FPS: {self.fps:.1f}", (20, 40),
-                       cv2.FONT_HERSHEY_SIMPLEX, 1.0, self.text_color, 2)
-            
-            # Show frame
-            cv2.imshow('Openpilot Lane Detection', frame)
+                # Calculate FPS
+                current_time = time.time()
+                if current_time - self.last_fps_time >= 1.0:
+                    self.fps = self.frame_count / (current_time - self.last_fps_time)
+                    self.frame_count = 0
+                    self.last_fps_time = current_time
+                
+                # Status text is redrawn only when it reads differently
+                hud_key = (f"{self.fps:.1f}", self.steer_text, self.lane_text, self.error_text)
+                self.hud_layer.update(self.draw_hud, key=hud_key)
+                
+                # Composite the cached layers onto the camera frame
+                self.model_layer.blend(frame)
+                self.hud_layer.blend(frame)
+                
+                # Show frame (the window keeps it until the next refresh)
+                cv2.imshow('Openpilot Lane Detection', frame)
+                last_frame = frame
             
-            # Handle keyboard input
-            key = cv2.waitKey(30) & 0xFF
+            # Handle keyboard input; sleeps until the next refresh instead of polling
+            key = cv2.waitKey(100 if paused else self.reader.wait_ms()) & 0xFF
             if key == ord('q') or key == 27:  # Q or ESC
                 break
             elif key == ord(' '):  # Space
                 paused = not paused
                 print(f"{'Paused' if paused else 'Resumed'}")
+                if paused and last_frame is not None:
+                    # Not read again while paused, so the reader's buffer still holds it
+                    cv2.putText(last_frame, "PAUSED", (self.display_width // 2 - 100, 50),
+                               cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 165, 255), 3)
+                    cv2.imshow('Openpilot Lane Detection', last_frame)
         
         # Cleanup
-        if hasattr(self, 'cap'):
-            self.cap.release()
         cv2.destroyAllWindows()
         print("\n✅ Viewer closed\n")
 
 def main():
+    parser = argparse.ArgumentParser(description='Openpilot lane detection viewer')
+    parser.add_argument('--display-hz', type=float, default=10.0,
+                        help='Display refresh rate (camera runs at 20 fps)')
+    args = parser.parse_args()
+    
+    # Yield the CPU to modeld
+    lower_priority()
     viewer = OpenpilotViewer()
-    viewer.run()
+    viewer.run(args.display_hz)
 
 if __name__ == '__main__':
     main()
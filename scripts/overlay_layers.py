@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Cached overlay layers for the openpilot viewers
+
+modelV2 arrives at 20 Hz and the HUD values change even less often, so the
+viewers rasterize each into an OverlayLayer only when its content changes
+and just alpha-blend the cached layers onto every displayed camera frame.
+
+    model_layer = OverlayLayer((1280, 720))
+    if sm.updated['modelV2']:
+        model_layer.update(lambda canvas: draw_lanes(canvas, sm['modelV2']))
+    hud_layer.update(draw_hud, key=(steer_text, fps_text))   # Redrawn only if the text changed
+    model_layer.blend(frame)
+    hud_layer.blend(frame)
+"""
+
+import cv2
+import numpy as np
+
+_UNSET = object()
+
+
+def color(bgr, alpha=1.0):
+    """BGRA drawing color for a layer canvas (premultiplied by alpha)"""
+    return (bgr[0] * alpha, bgr[1] * alpha, bgr[2] * alpha, 255 * alpha)
+
+
+class OverlayLayer:
+    """
+    Premultiplied BGRA layer, redrawn only when its content changes
+
+    Draw into the canvas with color(): OpenCV blends anti-aliased edges
+    towards the transparent background, which leaves exactly premultiplied
+    pixels. After each redraw the drawn bounding box is cached as a color
+    plane and an inverse-alpha plane, so blend() is one multiply and one add
+    over that box.
+    """
+
+    def __init__(self, size):
+        width, height = size
+        self.canvas = np.zeros((height, width, 4), dtype=np.uint8)
+        self.key = _UNSET
+        self.redraws = 0
+
+        self._alpha = np.empty((height, width), dtype=np.uint8)
+        self._box = None
+        self._color = None
+        self._inv_alpha = None
+
+    def update(self, draw, key=None):
+        """
+        Redraw with draw(canvas) unless key equals the previous key; None always redraws
+
+        Returns True if the layer was redrawn.
+        """
+        if key is not None and key == self.key:
+            return False
+
+        if self._box is not None:
+            self.canvas[self._box] = 0  # Only the last drawn area can be non-zero
+        draw(self.canvas)
+        self.key = key
+        self.redraws += 1
+
+        cv2.extractChannel(self.canvas, 3, dst=self._alpha)
+        x, y, w, h = cv2.boundingRect(self._alpha)
+        if w == 0:
+            self._box = None
+            return True
+        self._box = (slice(y, y + h), slice(x, x + w))
+        box = self.canvas[self._box]
+        self._color = cv2.cvtColor(box, cv2.COLOR_BGRA2BGR)  # Much faster than a numpy channel slice copy
+        inv_alpha = 255 - self._alpha[self._box]
+        self._inv_alpha = cv2.merge((inv_alpha, inv_alpha, inv_alpha))
+        return True
+
+    def blend(self, frame):
+        """Composite the layer onto a BGR frame in place"""
+        if self._box is None:
+            return
+        roi = frame[self._box]
+        cv2.multiply(roi, self._inv_alpha, dst=roi, scale=1 / 255)
+        cv2.add(roi, self._color, dst=roi)
@@ -1,46 +1,130 @@
 #!/usr/bin/env python3
+"""
+Test the BGR -> NV12 conversion camerad does
+
+Default: read one frame from the webcam and run the PyAV conversion step by step.
+--benchmark: compare fps and per-frame allocations of the old PyAV path
+(flip + reformat + tobytes) against Nv12Converter at 720p and 1080p.
+No camera needed for the benchmark.
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
 import cv2
 import av
+import numpy as np
+
+# Patched camera.py lives in the VM archive
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "vm-archive" / "openpilot-patches"))
+from camera import Nv12Converter
+
+
+def check_camera(device):
+    # Test the exact conversion camerad does
+    print(f"Opening {device}...")
+    cap = cv2.VideoCapture(device)
+
+    if not cap.isOpened():
+        print("❌ Failed to open camera")
+        exit(1)
+
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280.0)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720.0)
+
+    print("Reading one frame...")
+    ret, frame = cap.read()
+    if not ret:
+        print("❌ Failed to read frame")
+        exit(1)
+
+    print(f"✅ Frame read: {frame.shape}")
+
+    # Try bgr2nv12 conversion like camerad does
+    print("\nTrying bgr2nv12 conversion...")
+    try:
+        av_frame = av.VideoFrame.from_ndarray(frame, format='bgr24')
+        print(f"✅ Created av.VideoFrame: {av_frame.width}x{av_frame.height}")
+
+        nv12_frame = av_frame.reformat(format='nv12')
+        print(f"✅ Converted to nv12: {nv12_frame.width}x{nv12_frame.height}")
+
+        nv12_data = nv12_frame.to_ndarray()
+        print(f"✅ Got ndarray: {nv12_data.shape}")
+
+        yuv_bytes = nv12_data.data.tobytes()
+        print(f"✅ Got bytes: {len(yuv_bytes)} bytes")
+
+        print("\n✓ bgr2nv12 conversion works!")
+    except Exception as e:
+        print(f"❌ Conversion failed: {e}")
+        import traceback
+        traceback.print_exc()
+
+    cap.release()
+
+
+def pyav_path(bgr):
+    """What camera.py did before: flip, PyAV reformat, to_ndarray, tobytes"""
+    flipped = cv2.flip(bgr, -1)
+    frame = av.VideoFrame.from_ndarray(flipped, format='bgr24')
+    return frame.reformat(format='nv12').to_ndarray().data.tobytes()
+
+
+def measure(fn, bgr, frames):
+    fn(bgr)  # Warm up (first call allocates lazily-created buffers)
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        fn(bgr)
+    fps = frames / (time.perf_counter() - start)
+
+    # Allocations are measured separately so tracing overhead doesn't skew fps
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    for _ in range(10):
+        fn(bgr)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return fps, peak - before
+
+
+def benchmark(frames):
+    resolutions = [(1280, 720), (1920, 1080)]
+    print(f"BGR -> NV12 (with 180° rotation), {frames} frames per run\n")
+    print(f"{'resolution':<12} {'path':<16} {'fps':>8} {'peak alloc/frame':>18}")
+
+    for w, h in resolutions:
+        bgr = np.random.randint(0, 256, (h, w, 3), dtype=np.uint8)
+        converter = Nv12Converter(w, h, rotate_180=True)
+
+        results = {
+            'PyAV': measure(pyav_path, bgr, frames),
+            'Nv12Converter': measure(converter.convert, bgr, frames),
+        }
+        for name, (fps, alloc) in results.items():
+            print(f"{w}x{h:<7} {name:<16} {fps:8.1f} {alloc / 1024:15.0f} KB")
+
+        speedup = results['Nv12Converter'][0] / results['PyAV'][0]
+        print(f"{'':<12} {'speedup':<16} {speedup:7.2f}x\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Test/benchmark BGR -> NV12 conversion')
+    parser.add_argument('--device', default='/dev/video0', help='Camera device')
+    parser.add_argument('--benchmark', action='store_true', help='Benchmark PyAV vs Nv12Converter')
+    parser.add_argument('--frames', type=int, default=200, help='Frames per benchmark run')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.frames)
+    else:
+        check_camera(args.device)
+
 
-# Test the exact conversion camerad does
-device = "/dev/video0"
-print(f"Opening {device}...")
-cap = cv2.VideoCapture(device)
-
-if not cap.isOpened():
-    print("❌ Failed to open camera")
-    exit(1)
-
-cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280.0)
-cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720.0)
-
-print("Reading one frame...")
-ret, frame = cap.read()
-if not ret:
-    print("❌ Failed to read frame")
-    exit(1)
-
-print(f"✅ Frame read: {frame.shape}")
-
-# Try bgr2nv12 conversion like camerad does
-print("\nTrying bgr2nv12 conversion...")
-try:
-    av_frame = av.VideoFrame.from_ndarray(frame, format='bgr24')
-    print(f"✅ Created av.VideoFrame: {av_frame.width}x{av_frame.height}")
-    
-    nv12_frame = av_frame.reformat(format='nv12')
-    print(f"✅ Converted to nv12: {nv12_frame.width}x{nv12_frame.height}")
-    
-    nv12_data = nv12_frame.to_ndarray()
-    print(f"✅ Got ndarray: {nv12_data.shape}")
-    
-    yuv_bytes = nv12_data.data.tobytes()
-    print(f"✅ Got bytes: {len(yuv_bytes)} bytes")
-    
-    print("\n✓ bgr2nv12 conversion works!")
-except Exception as e:
-    print(f"❌ Conversion failed: {e}")
-    import traceback
-    traceback.print_exc()
-
-cap.release()
+if __name__ == '__main__':
+    main()
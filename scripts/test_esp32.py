@@ -8,6 +8,11 @@ import serial
 import time
 import sys
 import argparse
+from pathlib import Path
+
+# Frame encoding is shared with the bridge
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "bridge"))
+import serial_protocol
 
 
 def test_serial_connection(port: str, baud: int = 115200):
@@ -15,15 +20,16 @@ def test_serial_connection(port: str, baud: int = 115200):
     print(f"Testing serial connection to {port} @ {baud} baud...")
     
     try:
-        ser = serial.Serial(port, baud, timeout=2)
-        time.sleep(2)  # Wait for ESP32 to initialize
+        ser = serial.Serial(port, baud, timeout=0.1)
         
-        # Read startup message
-        if ser.in_waiting:
-            msg = ser.readline().decode('utf-8', errors='ignore').strip()
-            print(f"✓ ESP32 connected: {msg}")
+        # Wait for the boot banner or a PING reply instead of a fixed delay
+        start = time.monotonic()
+        msg = serial_protocol.wait_until_ready(ser, timeout=3.0)
+        if msg is not None:
+            print(f"✓ ESP32 connected after {(time.monotonic() - start) * 1000:.0f} ms: {msg}")
         else:
             print("⚠ No startup message received")
+        ser.timeout = 2
         
         return ser
     except serial.SerialException as e:
@@ -116,6 +122,37 @@ def test_invalid_commands(ser: serial.Serial):
     print("✓ Invalid command handling tested")
 
 
+def test_binary_frames(ser: serial.Serial):
+    """Test binary protocol negotiation and framed commands"""
+    print("\nTesting binary framing...")
+    ser.reset_input_buffer()
+    ser.write(serial_protocol.PROTO_REQUEST)
+    time.sleep(0.2)
+    
+    reply = ser.readline().decode('utf-8', errors='ignore').strip()
+    if reply != serial_protocol.PROTO_ACK:
+        print(f"  ⚠ Firmware did not acknowledge binary framing: {reply or 'no reply'}")
+        return
+    print(f"  Response: {reply}")
+    
+    for seq, pwm in enumerate([80, 0, -80, 0]):
+        print(f"  Sending frame seq={seq} pwm={pwm:+d}")
+        ser.write(serial_protocol.encode_frame(seq, pwm))
+        time.sleep(0.3)
+    
+    # Corrupt the CRC - firmware should report it and stop
+    bad = bytearray(serial_protocol.encode_frame(4, 100))
+    bad[-1] ^= 0xFF
+    ser.write(bytes(bad))
+    time.sleep(0.1)
+    if ser.in_waiting:
+        response = ser.readline().decode('utf-8', errors='ignore').strip()
+        print(f"  Bad CRC response: {response}")
+    
+    ser.write(serial_protocol.encode_frame(5, 0, serial_protocol.FLAG_STOP))
+    print("✓ Binary framing tested")
+
+
 def interactive_mode(ser: serial.Serial):
     """Interactive command prompt"""
     print("\nInteractive mode - Enter commands (Ctrl+C to exit):")
@@ -193,6 +230,9 @@ def main():
             test_invalid_commands(ser)
             time.sleep(0.5)
             
+            test_binary_frames(ser)
+            time.sleep(0.5)
+            
             print("\n" + "="*50)
             print("✓ All automated tests complete!")
             print("="*50)
@@ -22,6 +22,8 @@ except ImportError as e:
     print(f"ERROR: Cannot import cereal: {e}")
     sys.exit(1)
 
+from lane_detection import SIMPLE, LanePipeline, lane_deviation
+
 def draw_lane_overlay(frame, model_data):
     """Draw lane lines on the frame based on model output"""
     overlay = frame.copy()
@@ -56,6 +58,9 @@ def main():
     pm = messaging.PubMaster(['carControl'])
     print("✓ Connected\n")
     
+    # Shared lane_detection pipeline for the simulated steering command
+    pipeline = LanePipeline(SIMPLE)
+    
     # Open webcam
     print("📷 Opening webcam...")
     cap = cv2.VideoCapture(0, cv2.CAP_V4L2)
@@ -134,18 +139,12 @@ def main():
                 last_save = elapsed
             
             # Simulate steering command based on image processing
-            # (Simple center-of-mass calculation)
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            _, thresh = cv2.threshold(gray, 200, 255, cv2.THRESH_BINARY)
-            
-            # Calculate "lane center"
-            height, width = thresh.shape
-            road_region = thresh[height//2:, :]
-            moments = cv2.moments(road_region)
+            # (lane centre from the shared OpenCV lane pipeline)
+            result = pipeline.run(frame)
             
-            if moments['m00'] > 0:
-                cx = int(moments['m10'] / moments['m00'])
-                deviation = (cx - width//2) / (width//2)  # -1 to +1
+            if result.left is not None and result.right is not None:
+                height, width = frame.shape[:2]
+                deviation = lane_deviation(result.left, result.right, height, width)  # -1 to +1
                 steer = -deviation * 0.3  # Invert and scale
             else:
                 steer = 0.0
@@ -170,6 +169,7 @@ def main():
     print("="*70)
     print(f"\n  Total frames: {frame_count}")
     print(f"  Average FPS: {avg_fps:.1f}")
+    print(f"  Lane stages: {pipeline.timer.summary()}")
     print(f"  Output directory: {output_dir}")
     print(f"\n  To view frames:")
     print(f"    cd {output_dir}")
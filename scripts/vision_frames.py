@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Shared VisionIPC frame reader for the openpilot viewers
+
+Reads camerad's road stream straight out of its shared-memory buffers (the
+NV12 planes are numpy views, nothing is copied) and converts to BGR only
+when the display is due to refresh, at display_hz rather than camera rate.
+The client is conflated, so frames skipped between refreshes cost nothing.
+Viewers pace their loop with wait_ms() instead of polling, and
+lower_priority() renices them so modeld wins the CPU on the same machine.
+
+    reader = VisionFrameReader(display_hz=10)
+    reader.connect()
+    while True:
+        frame = reader.read()               # None until the next refresh is due
+        if frame is not None:
+            cv2.imshow('viewer', frame)
+        key = cv2.waitKey(reader.wait_ms())
+"""
+
+import math
+import os
+import time
+
+import cv2
+import numpy as np
+from cereal.visionipc import VisionIpcClient, VisionStreamType
+
+# Viewers are best-effort; modeld/controlsd must never wait on them
+VIEWER_NICENESS = 10
+
+
+def lower_priority(niceness=VIEWER_NICENESS):
+    """Renice this process so it only gets CPU time openpilot doesn't need"""
+    try:
+        os.nice(niceness)
+    except OSError as e:
+        print(f"⚠️  Could not lower viewer priority: {e}")
+
+
+class VisionFrameReader:
+    """Latest road-camera frame from VisionIPC, as BGR at display size and display rate"""
+
+    def __init__(self, display_size=(1280, 720), display_hz=10.0,
+                 stream=VisionStreamType.VISION_STREAM_ROAD, server="camerad"):
+        self.display_size = display_size
+        self.period = 1.0 / display_hz
+        self.client = VisionIpcClient(server, stream, True)  # Conflated: only the newest buffer is kept
+
+        self.next_refresh = 0.0
+        self.frames = 0
+
+        # Reused for every refresh (allocated once the camera size is known)
+        self._bgr = None
+        self._display = None
+
+    @property
+    def width(self):
+        return self.client.width
+
+    @property
+    def height(self):
+        return self.client.height
+
+    def connect(self, blocking=False):
+        """Connect to camerad's stream; False if it isn't up (yet)"""
+        return self.client.is_connected() or self.client.connect(blocking)
+
+    def wait_ms(self):
+        """Milliseconds until the next refresh is due (at least 1, for cv2.waitKey)"""
+        return max(1, math.ceil((self.next_refresh - time.monotonic()) * 1000))
+
+    def read(self, timeout_ms=100):
+        """
+        BGR frame at display size when a refresh is due, else None
+
+        The returned array is reused by the next read(); copy it to keep it.
+        """
+        now = time.monotonic()
+        if now < self.next_refresh or not self.connect():
+            return None
+
+        buf = self.client.recv(timeout_ms)
+        if buf is None:
+            return None
+        # Schedule from the previous deadline so the rate doesn't drift; resync after a stall
+        self.next_refresh = max(self.next_refresh + self.period, now)
+        self.frames += 1
+        return self._convert(buf)
+
+    def _convert(self, buf):
+        w, h, stride = buf.width, buf.height, buf.stride
+        data = np.frombuffer(buf.data, dtype=np.uint8)
+
+        # Views into the shared buffer; stride padding is skipped, not copied out
+        y = data[:h * stride].reshape(h, stride)[:, :w]
+        uv = data[buf.uv_offset:buf.uv_offset + h // 2 * stride].reshape(h // 2, stride // 2, 2)[:, :w // 2]
+
+        if self._bgr is None or self._bgr.shape[:2] != (h, w):
+            self._bgr = np.empty((h, w, 3), dtype=np.uint8)
+            self._display = np.empty((self.display_size[1], self.display_size[0], 3), dtype=np.uint8)
+        cv2.cvtColorTwoPlane(y, uv, cv2.COLOR_YUV2BGR_NV12, dst=self._bgr)
+
+        if (w, h) == self.display_size:
+            return self._bgr
+        cv2.resize(self._bgr, self.display_size, dst=self._display, interpolation=cv2.INTER_AREA)
+        return self._display
@@ -16,84 +16,36 @@ sys.path.insert(0, str(openpilot_path))
 
 import cereal.messaging as messaging
 
-def detect_lanes_simple(frame):
-    """Simple lane detection using edge detection"""
-    height, width = frame.shape[:2]
-    
-    # Region of interest (bottom half)
-    roi = frame[height//2:, :]
-    
-    # Convert to grayscale
-    gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
-    
-    # Apply Gaussian blur
-    blur = cv2.GaussianBlur(gray, (5, 5), 0)
-    
-    # Edge detection
-    edges = cv2.Canny(blur, 50, 150)
-    
-    # Hough line detection
-    lines = cv2.HoughLinesP(edges, 1, np.pi/180, 50, minLineLength=50, maxLineGap=150)
-    
-    return lines, edges
+from lane_detection import SIMPLE, LanePipeline
 
-def draw_lanes(frame, lines):
+def draw_lanes(frame, result):
     """Draw detected lane lines on frame"""
     overlay = frame.copy()
     height, width = frame.shape[:2]
     
-    if lines is not None:
-        left_lines = []
-        right_lines = []
+    left_lines, right_lines = result.left_lines, result.right_lines
+    
+    # Draw left and right lane segments (yellow); lines are already in frame coordinates
+    for x1, y1, x2, y2 in np.concatenate((left_lines, right_lines)):
+        cv2.line(overlay, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 255), 3)
+    
+    # Calculate steering based on lane center
+    if len(left_lines) and len(right_lines):
+        # Find average x position of lanes at bottom of image
+        left_x = np.mean(left_lines[:, 0])
+        right_x = np.mean(right_lines[:, 0])
         
-        for line in lines:
-            x1, y1, x2, y2 = line[0]
-            # Adjust y coordinates (they're relative to ROI)
-            y1 += height//2
-            y2 += height//2
-            
-            # Calculate slope
-            if x2 - x1 == 0:
-                continue
-            slope = (y2 - y1) / (x2 - x1)
-            
-            # Categorize as left or right lane
-            if slope < -0.5:  # Left lane (negative slope)
-                left_lines.append(line[0])
-            elif slope > 0.5:  # Right lane (positive slope)
-                right_lines.append(line[0])
+        lane_center = (left_x + right_x) / 2
+        frame_center = width / 2
         
-        # Draw left lane (yellow)
-        for line in left_lines:
-            x1, y1, x2, y2 = line
-            y1 += height//2
-            y2 += height//2
-            cv2.line(overlay, (x1, y1), (x2, y2), (0, 255, 255), 3)
+        deviation = (lane_center - frame_center) / (width / 2)
+        steer = -deviation * 0.5
         
-        # Draw right lane (yellow)
-        for line in right_lines:
-            x1, y1, x2, y2 = line
-            y1 += height//2
-            y2 += height//2
-            cv2.line(overlay, (x1, y1), (x2, y2), (0, 255, 255), 3)
+        # Draw center path (green)
+        path_x = int(lane_center)
+        cv2.line(overlay, (path_x, height), (path_x, height//2), (0, 255, 0), 2)
         
-        # Calculate steering based on lane center
-        if left_lines and right_lines:
-            # Find average x position of lanes at bottom of image
-            left_x = np.mean([line[0] for line in left_lines])
-            right_x = np.mean([line[0] for line in right_lines])
-            
-            lane_center = (left_x + right_x) / 2
-            frame_center = width / 2
-            
-            deviation = (lane_center - frame_center) / (width / 2)
-            steer = -deviation * 0.5
-            
-            # Draw center path (green)
-            path_x = int(lane_center)
-            cv2.line(overlay, (path_x, height), (path_x, height//2), (0, 255, 0), 2)
-            
-            return overlay, steer
+        return overlay, steer
     
     return overlay, 0.0
 
@@ -110,6 +62,9 @@ def main():
     # Setup messaging for steering commands
     pm = messaging.PubMaster(['carControl'])
     
+    # Bottom-half grayscale Canny/Hough (shared lane_detection pipeline)
+    pipeline = LanePipeline(SIMPLE)
+    
     # Open webcam
     print("📷 Opening webcam...")
     cap = cv2.VideoCapture(0, cv2.CAP_V4L2)
@@ -149,8 +104,8 @@ def main():
             frame_count += 1
             
             # Detect and draw lanes
-            lines, edges = detect_lanes_simple(frame)
-            output, steer = draw_lanes(frame, lines)
+            result = pipeline.run(frame)
+            output, steer = draw_lanes(frame, result)
             
             # Calculate PWM
             pwm = int(steer * 150)
@@ -200,6 +155,7 @@ def main():
         print("="*70)
         print(f"\n  Total frames: {frame_count}")
         print(f"  Average FPS: {avg_fps:.1f}")
+        print(f"  Lane stages: {pipeline.timer.summary()}")
         print("="*70 + "\n")
 
 if __name__ == '__main__':
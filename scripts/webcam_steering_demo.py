@@ -6,56 +6,28 @@ Shows camera feed with smooth curved lane detection and animated steering wheel
 
 import sys
 import time
+import argparse
 import cv2
 import numpy as np
 from pathlib import Path
-from collections import deque
+
+from lane_detection import BirdseyeLaneDetector, LaneTracker, PyramidLaneDetector, SteeringFilter, lane_deviation
 
 # Add openpilot to path
 openpilot_path = Path.home() / "openpilot"
 sys.path.insert(0, str(openpilot_path))
 
-import cereal.messaging as messaging
+# Curves are drawn over the bottom half; lines are up to 5 px wide (+ anti-aliasing)
+DRAW_MARGIN = 8
 
-class SteeringHistory:
-    """Track steering history for smoothing"""
-    def __init__(self, size=10):
-        self.history = deque(maxlen=size)
-    
-    def add(self, value):
-        self.history.append(value)
-    
-    def get_smooth(self):
-        if not self.history:
-            return 0.0
-        return float(np.mean(self.history))
+# Share of the frame period the pyramid detector may spend; the rest is
+# capture, overlay drawing and display
+DETECT_BUDGET_FRACTION = 0.5
 
-def fit_lane_curve(lines, height, width, is_left=True):
-    """Fit a polynomial curve to lane lines"""
-    if not lines:
-        return None
-    
-    points = []
-    for line in lines:
-        x1, y1, x2, y2 = line
-        y1 += height//2
-        y2 += height//2
-        points.extend([(x1, y1), (x2, y2)])
-    
-    if len(points) < 3:
-        return None
-    
-    # Convert to numpy arrays
-    points = np.array(points)
-    x = points[:, 0]
-    y = points[:, 1]
-    
-    # Fit polynomial (2nd degree for curves)
-    try:
-        z = np.polyfit(y, x, 2)
-        return np.poly1d(z)
-    except:
-        return None
+def _curve_points(x, y_points, width):
+    """(N, 2) int32 polyline of the samples that fall inside the frame"""
+    inside = (x >= 0) & (x < width)
+    return np.column_stack((x[inside], y_points[inside])).astype(np.int32)
 
 def draw_curved_lane(overlay, poly, height, width, color):
     """Draw smooth curved lane line"""
@@ -63,15 +35,9 @@ def draw_curved_lane(overlay, poly, height, width, color):
         return
     
     y_points = np.linspace(height//2, height-1, 50)
-    points = []
-    
-    for y in y_points:
-        x = poly(y)
-        if 0 <= x < width:
-            points.append([int(x), int(y)])
+    points = _curve_points(np.polyval(poly, y_points), y_points, width)
     
     if len(points) > 1:
-        points = np.array(points, dtype=np.int32)
         cv2.polylines(overlay, [points], False, color, 5, cv2.LINE_AA)
 
 def draw_steering_wheel(img, steer_angle, pwm_value):
@@ -136,113 +102,65 @@ def draw_steering_wheel(img, steer_angle, pwm_value):
                        (center_x - radius - 60, center_y), 
                        (0, 165, 255), 3, tipLength=0.4)
 
-def detect_lanes_improved(frame):
-    """Improved lane detection with better edge detection"""
-    height, width = frame.shape[:2]
-    
-    # Region of interest (bottom 60%)
-    roi = frame[int(height*0.4):, :]
-    
-    # Convert to HLS color space (better for lane detection)
-    hls = cv2.cvtColor(roi, cv2.COLOR_BGR2HLS)
-    
-    # Extract L channel (lightness)
-    l_channel = hls[:,:,1]
-    
-    # Apply CLAHE for better contrast
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-    enhanced = clahe.apply(l_channel)
-    
-    # Apply Gaussian blur
-    blur = cv2.GaussianBlur(enhanced, (7, 7), 0)
-    
-    # Adaptive threshold for better line detection
-    edges = cv2.Canny(blur, 30, 100)
-    
-    # Morphological operations to connect broken lines
-    kernel = np.ones((3,3), np.uint8)
-    edges = cv2.dilate(edges, kernel, iterations=1)
-    
-    # Hough line detection with adjusted parameters
-    lines = cv2.HoughLinesP(edges, 1, np.pi/180, 40, 
-                           minLineLength=40, maxLineGap=200)
-    
-    return lines, edges
+class OverlayBuffers:
+    """Overlay and output images reused across frames (reallocated only if the frame size changes)"""
+    def __init__(self):
+        self.overlay = None
+        self.output = None
+    
+    def get(self, frame):
+        if self.overlay is None or self.overlay.shape != frame.shape:
+            self.overlay = np.empty_like(frame)
+            self.output = np.empty_like(frame)
+        return self.overlay, self.output
 
-def draw_lanes_with_curves(frame, lines):
-    """Draw curved lane lines with better visualization"""
-    overlay = frame.copy()
+def draw_lanes_with_curves(frame, left_curve, right_curve, buffers=None):
+    """Draw curved lane lines with better visualization; steer is None unless both lanes are known"""
+    overlay, output = (buffers or OverlayBuffers()).get(frame)
     height, width = frame.shape[:2]
     
-    if lines is not None:
-        left_lines = []
-        right_lines = []
-        
-        for line in lines:
-            x1, y1, x2, y2 = line[0]
-            
-            # Calculate slope
-            if x2 - x1 == 0:
-                continue
-            slope = (y2 - y1) / (x2 - x1)
-            
-            # Categorize as left or right lane
-            if slope < -0.3:  # Left lane (negative slope) - relaxed threshold
-                left_lines.append(line[0])
-            elif slope > 0.3:  # Right lane (positive slope)
-                right_lines.append(line[0])
+    if left_curve is None and right_curve is None:
+        np.copyto(output, frame)
+        return output, None
+    
+    # Everything is drawn below band_top; above it the blend would give back the frame
+    band_top = max(height//2 - DRAW_MARGIN, 0)
+    np.copyto(overlay[band_top:], frame[band_top:])
+    
+    # Draw curved lanes
+    draw_curved_lane(overlay, left_curve, height, width, (0, 255, 255))  # Yellow
+    draw_curved_lane(overlay, right_curve, height, width, (0, 255, 255))  # Yellow
+    
+    # Calculate steering based on lane positions (the detectors' lane filter
+    # fills in a lost lane from the other one, so both are usually present)
+    steer = None
+    if left_curve is not None and right_curve is not None:
+        # Lane centre vs frame centre near the bottom of the image
+        deviation = lane_deviation(left_curve, right_curve, height, width)
+        steer = -deviation * 0.8  # Increased sensitivity
         
-        # Fit curves to lanes
-        left_curve = fit_lane_curve(left_lines, height, width, is_left=True)
-        right_curve = fit_lane_curve(right_lines, height, width, is_left=False)
+        # Draw center path (green)
+        y_points = np.linspace(height//2, height-1, 30)
+        center_x = (np.polyval(left_curve, y_points) + np.polyval(right_curve, y_points)) / 2
+        center_points = _curve_points(center_x, y_points, width)
         
-        # Draw curved lanes
-        draw_curved_lane(overlay, left_curve, height, width, (0, 255, 255))  # Yellow
-        draw_curved_lane(overlay, right_curve, height, width, (0, 255, 255))  # Yellow
-        
-        # Calculate steering based on lane positions
-        steer = 0.0
-        if left_curve and right_curve:
-            # Sample at bottom of image
-            y_sample = height - 50
-            left_x = left_curve(y_sample)
-            right_x = right_curve(y_sample)
-            
-            lane_center = (left_x + right_x) / 2
-            frame_center = width / 2
-            
-            deviation = (lane_center - frame_center) / (width / 2)
-            steer = -deviation * 0.8  # Increased sensitivity
-            
-            # Draw center path (green)
-            y_points = np.linspace(height//2, height-1, 30)
-            center_points = []
-            for y in y_points:
-                try:
-                    center_x = (left_curve(y) + right_curve(y)) / 2
-                    if 0 <= center_x < width:
-                        center_points.append([int(center_x), int(y)])
-                except:
-                    pass
-            
-            if len(center_points) > 1:
-                center_points = np.array(center_points, dtype=np.int32)
-                cv2.polylines(overlay, [center_points], False, (0, 255, 0), 4, cv2.LINE_AA)
-        
-        elif left_curve:
-            # Only left lane visible - steer right
-            steer = 0.3
-        elif right_curve:
-            # Only right lane visible - steer left
-            steer = -0.3
-        
-        # Blend overlay with original frame
-        result = cv2.addWeighted(frame, 0.7, overlay, 0.3, 0)
-        return result, steer
+        if len(center_points) > 1:
+            cv2.polylines(overlay, [center_points], False, (0, 255, 0), 4, cv2.LINE_AA)
     
-    return overlay, 0.0
+    # Blend overlay with original frame (only the band that was drawn on)
+    np.copyto(output[:band_top], frame[:band_top])
+    cv2.addWeighted(frame[band_top:], 0.7, overlay[band_top:], 0.3, 0, dst=output[band_top:])
+    return output, steer
 
 def main():
+    parser = argparse.ArgumentParser(description='Webcam lane detection with a virtual steering wheel')
+    parser.add_argument('--detector', choices=['tracker', 'birdseye', 'pyramid'], default='tracker',
+                        help="Lane detector: Hough + strip tracking, bird's-eye sliding windows, "
+                             "or multi-resolution Hough within a time budget")
+    parser.add_argument('--target-fps', type=float, default=20.0,
+                        help='Frame rate the pyramid detector picks its resolution for')
+    args = parser.parse_args()
+    
     print("="*70)
     print("  🎮 ENHANCED STEERING WHEEL DEMO")
     print("="*70)
@@ -257,11 +175,25 @@ def main():
     print("\n  Press 'q' to quit")
     print("="*70 + "\n")
     
+    # Imported here so the lane code can be benchmarked without openpilot
+    import cereal.messaging as messaging
+    
     # Setup messaging for steering commands
     pm = messaging.PubMaster(['carControl'])
     
-    # Steering history for smoothing
-    steer_history = SteeringHistory(size=8)
+    # Kalman-filtered steering (held briefly while no lanes are seen, then released to 0)
+    steer_filter = SteeringFilter()
+    
+    # Lane tracker (full Hough search only when a lane is lost), bird's-eye
+    # detector, or pyramid detector (coarser when over budget)
+    if args.detector == 'tracker':
+        tracker = LaneTracker()
+    elif args.detector == 'birdseye':
+        tracker = BirdseyeLaneDetector()
+    else:
+        tracker = PyramidLaneDetector(budget_s=DETECT_BUDGET_FRACTION / args.target_fps)
+    detect_time = 0.0
+    overlay_buffers = OverlayBuffers()
     
     # Open webcam
     print("📷 Opening webcam...")
@@ -301,13 +233,14 @@ def main():
             
             frame_count += 1
             
-            # Detect and draw curved lanes
-            lines, edges = detect_lanes_improved(frame)
-            output, steer_raw = draw_lanes_with_curves(frame, lines)
+            # Track and draw curved lanes
+            t0 = time.perf_counter()
+            left_curve, right_curve = tracker.update(frame)
+            detect_time += time.perf_counter() - t0
+            output, steer_raw = draw_lanes_with_curves(frame, left_curve, right_curve, overlay_buffers)
             
             # Smooth steering
-            steer_history.add(steer_raw)
-            steer = steer_history.get_smooth()
+            steer = steer_filter.update(steer_raw)
             
             # Calculate PWM (capped at 200 for safety)
             pwm = int(np.clip(steer * 150, -200, 200))
@@ -320,8 +253,8 @@ def main():
             fps = frame_count / elapsed if elapsed > 0 else 0
             
             # Status box (semi-transparent background)
-            cv2.rectangle(output, (5, 5), (350, 200), (0, 0, 0), -1)
-            cv2.rectangle(output, (5, 5), (350, 200), (255, 255, 255), 2)
+            cv2.rectangle(output, (5, 5), (460, 235), (0, 0, 0), -1)
+            cv2.rectangle(output, (5, 5), (460, 235), (255, 255, 255), 2)
             
             # Status text
             cv2.putText(output, f"FPS: {fps:.1f}", (15, 35), 
@@ -352,6 +285,11 @@ def main():
             cv2.putText(output, direction, (15, 175), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.8, dir_color, 2)
             
+            # Lane detection cost and how often the full search ran
+            cv2.putText(output, f"Lanes: {detect_time / frame_count * 1000:.1f} ms "
+                       f"({tracker.status()})", (15, 210), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+            
             # Publish steering command
             msg = messaging.new_message('carControl')
             msg.carControl.enabled = True
@@ -377,6 +315,13 @@ def main():
         print("="*70)
         print(f"\n  Total frames: {frame_count}")
         print(f"  Average FPS: {avg_fps:.1f}")
+        if frame_count:
+            print(f"  Lane detection ({args.detector}): {detect_time / frame_count * 1000:.1f} ms/frame")
+            print(f"  Stages: {tracker.timer.summary()}")
+            if args.detector == 'tracker':
+                print(f"  Full Hough search on {tracker.full_searches}/{frame_count} frames")
+            elif args.detector == 'pyramid':
+                print(f"  Final level {tracker.status()}, {tracker.controller.switches} level switches")
         print("="*70 + "\n")
 
 if __name__ == '__main__':
@@ -55,6 +55,9 @@ cp "$ARCHIVE/controlsd.py" "$OPENPILOT/selfdrive/controls/"
 echo "  → camera.py (webcam V4L2 + MJPEG fix)"
 cp "$ARCHIVE/camera.py" "$OPENPILOT/tools/webcam/"
 
+echo "  → v4l2_caps.py (webcam capability cache used by camera.py)"
+cp "$ARCHIVE/v4l2_caps.py" "$OPENPILOT/tools/webcam/"
+
 echo ""
 echo "🧹 Clearing Python cache..."
 find "$OPENPILOT" -name "*.pyc" -delete 2>/dev/null || true
@@ -70,6 +73,7 @@ echo "  • selfdrive/selfdrived/state.py"
 echo "  • selfdrive/car/card.py"
 echo "  • selfdrive/controls/controlsd.py"
 echo "  • tools/webcam/camera.py"
+echo "  • tools/webcam/v4l2_caps.py (new)"
 echo ""
 echo "To restore originals:"
 echo "  cp $OPENPILOT/.backups/*.orig <target>"
@@ -93,6 +93,7 @@ sudo apt install -y \
     libswscale-dev \
     libv4l-dev \
     v4l-utils \
+    libturbojpeg0 \
     ffmpeg
 
 # Add user to video group for camera access
@@ -150,6 +151,9 @@ echo "========================================"
 # Install serial for bridge
 pip install pyserial pyyaml
 
+# libjpeg-turbo bindings: camera.py decodes webcam MJPEG straight to YUV with it
+pip install PyTurboJPEG
+
 echo ""
 echo "✓ All dependencies installed!"
 
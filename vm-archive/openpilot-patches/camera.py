@@ -1,5 +1,255 @@
+import threading
+import time
+
 import av
 import cv2 as cv
+import numpy as np
+
+try:
+  from openpilot.tools.webcam import v4l2_caps
+except ImportError:  # Run from the patch directory (scripts/test_bgr2nv12.py)
+  import v4l2_caps
+
+# Webcam is mounted upside down; rotation is folded into the NV12 conversion
+ROTATE_180 = True
+
+# Capture formats, most preferred first. Raw YUV skips the JPEG decode and the
+# RGB round trip, but most USB2 webcams can only do it at low frame rates, so
+# a format is only used if the camera also accepts the requested FPS.
+FOURCC_PREFERENCE = ('NV12', 'YUYV', 'MJPG')
+TARGET_FPS = 25.0
+CAPTURE_SIZE = (1280, 720)
+
+# MJPEG decoder backend: 'auto' (turbojpeg if installed, else opencv) | 'turbojpeg' | 'opencv'
+MJPEG_DECODER = 'auto'
+
+# 'full' publishes the whole frame; 'roi' crops (and resizes) to the region
+# modeld warps into its input before the NV12 conversion. The ROI frame acts
+# like a camera with MODEL_FOCAL_PX focal length and the mount's vanishing
+# point at the model's, so modeld must be set up with matching intrinsics.
+CAPTURE_MODE = 'full'
+MODEL_INPUT_SIZE = (512, 256)   # modeld (medmodel) input, w x h
+MODEL_FOCAL_PX = 910.0
+MODEL_VP_ROW = 47.6             # Vanishing point row in the model input
+ROI_MARGIN = 0.2                # Extra border so modeld's own warp has room for roll/drift
+WEBCAM_FOCAL_PX = 908.0         # Webcam focal length at the capture resolution
+# Static mount calibration (radians) the crop is placed with, measured once;
+# e.g. rpyCalib[1], rpyCalib[2] from a liveCalibration taken in 'full' mode
+ROI_PITCH = 0.0
+ROI_YAW = 0.0
+
+def _even(x):
+  return int(round(x / 2)) * 2
+
+class RoiCropper:
+  """
+  Crop + resize of captured planes to the model-input region
+
+  The crop is fixed at startup: its size because VisionIPC buffers are
+  created once, and its position (ROI_PITCH/ROI_YAW) on purpose. calibrationd
+  estimates rpyCalib from the published, already cropped stream and modeld
+  still warps with it, so a crop that followed liveCalibration would feed
+  back into the calibration and apply the rotation twice. The fixed crop only
+  removes the static mount offset; modeld corrects the rest as usual, within
+  the ROI_MARGIN border. Crops are taken in sensor orientation, so a 180
+  degree mount mirrors the rectangle instead of rotating the frame.
+  """
+  def __init__(self, src_w, src_h, rotate_180=False):
+    self.src_w, self.src_h = src_w, src_h
+    self.rotate_180 = rotate_180
+
+    mw, mh = MODEL_INPUT_SIZE
+    self.out_w = _even(mw * (1 + ROI_MARGIN))
+    self.out_h = _even(mh * (1 + ROI_MARGIN))
+    # Camera pixels per output pixel; shrink further if the crop would not fit the frame
+    self.scale = min(WEBCAM_FOCAL_PX / MODEL_FOCAL_PX, src_w / self.out_w, src_h / self.out_h)
+    self.crop_w = min(_even(self.out_w * self.scale), src_w)
+    self.crop_h = min(_even(self.out_h * self.scale), src_h)
+    # Vanishing point position inside the output frame
+    self._vp_out = (self.out_w / 2, (self.out_h - mh) / 2 + MODEL_VP_ROW)
+
+    self._scratch = {}
+    self.set_calibration(ROI_PITCH, ROI_YAW)
+
+  def set_calibration(self, pitch, yaw):
+    """Place the crop so the vanishing point of a camera at pitch/yaw lands on the model's"""
+    f = WEBCAM_FOCAL_PX
+    vp_x = self.src_w / 2 + f * np.tan(yaw)
+    vp_y = self.src_h / 2 - f * np.tan(pitch) / np.cos(yaw)
+    x0 = _even(vp_x - self._vp_out[0] * self.scale)
+    y0 = _even(vp_y - self._vp_out[1] * self.scale)
+    x0 = min(max(x0, 0), self.src_w - self.crop_w)
+    y0 = min(max(y0, 0), self.src_h - self.crop_h)
+    if self.rotate_180:
+      x0 = self.src_w - self.crop_w - x0
+      y0 = self.src_h - self.crop_h - y0
+    self.rect = (x0, y0, x0 + self.crop_w, y0 + self.crop_h)
+
+  def crop(self, plane, sub=1):
+    """View of the ROI in a plane subsampled by `sub` (2 for 4:2:0 chroma)"""
+    x0, y0, x1, y1 = self.rect
+    return plane[y0 // sub:y1 // sub, x0 // sub:x1 // sub]
+
+  def resize(self, plane, dst, sub=1):
+    """Crop `plane` and scale it into `dst`; allocation-free after the first frame"""
+    src = self.crop(plane, sub)
+    if src.shape[:2] == dst.shape[:2]:
+      np.copyto(dst, src)
+      return dst
+    if src.strides[-1] != src.itemsize or (src.ndim == 3 and src.strides[1] != src.itemsize * src.shape[2]):
+      # OpenCV needs contiguous pixels within a row (YUYV planes are strided views)
+      key = (src.shape, sub)
+      if key not in self._scratch:
+        self._scratch[key] = np.empty(src.shape, dtype=src.dtype)
+      np.copyto(self._scratch[key], src)
+      src = self._scratch[key]
+    cv.resize(src, (dst.shape[1], dst.shape[0]), dst=dst, interpolation=cv.INTER_AREA)
+    return dst
+
+  def savings(self):
+    full = self.src_w * self.src_h * 3 // 2
+    roi = self.out_w * self.out_h * 3 // 2
+    return full, roi
+
+class Nv12Converter:
+  """
+  BGR -> NV12 with cv.cvtColor(COLOR_BGR2YUV_I420) and an in-place UV interleave
+
+  All intermediate and output buffers are allocated once; convert() allocates
+  nothing. A 180 degree rotation is fused into the plane copies, so the BGR
+  frame is never flipped on its own.
+  """
+  def __init__(self, w, h, rotate_180=False, out=None):
+    self.w, self.h = w, h
+    self.rotate_180 = rotate_180
+    self.nv12 = out if out is not None else np.empty((h * 3 // 2, w), dtype=np.uint8)
+    self._y = self.nv12[:h]
+    self._uv = self.nv12[h:].reshape(h // 2, w // 2, 2)
+
+    # I420 is Y, then all of U, then all of V (each h/2 x w/2)
+    if rotate_180:
+      self._i420 = np.empty((h * 3 // 2, w), dtype=np.uint8)
+      chroma = self._i420[h:].reshape(-1)
+    else:
+      # cvtColor writes straight into the NV12 buffer; only chroma needs a scratch copy
+      self._i420 = self.nv12
+      self._chroma = np.empty(h * w // 2, dtype=np.uint8)
+      chroma = self._chroma
+    q = (h // 2) * (w // 2)
+    self._u = chroma[:q].reshape(h // 2, w // 2)
+    self._v = chroma[q:].reshape(h // 2, w // 2)
+
+  def convert(self, bgr):
+    """Convert one BGR frame; returns the (h*3/2, w) NV12 array (reused every call)"""
+    cv.cvtColor(bgr, cv.COLOR_BGR2YUV_I420, dst=self._i420)
+    if self.rotate_180:
+      np.copyto(self._y, self._i420[:self.h, ::-1][::-1])
+      np.copyto(self._uv[..., 0], self._u[::-1, ::-1])
+      np.copyto(self._uv[..., 1], self._v[::-1, ::-1])
+    else:
+      # Y is already in place; planar U,V get interleaved over themselves via the scratch copy
+      np.copyto(self._chroma, self.nv12[self.h:].reshape(-1))
+      np.copyto(self._uv[..., 0], self._u)
+      np.copyto(self._uv[..., 1], self._v)
+    return self.nv12
+
+class OpenCVMjpegDecoder:
+  """OpenCV decodes MJPEG to BGR inside cap.read(); Nv12Converter takes it from there"""
+  name = 'opencv (MJPEG -> BGR -> NV12)'
+  raw_capture = False
+
+  def __init__(self, w, h, rotate_180, out, roi=None):
+    self._roi = roi
+    if roi is not None:
+      w, h = roi.out_w, roi.out_h
+      self._bgr = np.empty((h, w, 3), dtype=np.uint8)
+    self._converter = Nv12Converter(w, h, rotate_180=rotate_180, out=out)
+
+  def decode(self, frame):
+    if self._roi is not None:
+      frame = self._roi.resize(frame, self._bgr)
+    self._converter.convert(frame)
+
+class TurboJpegDecoder:
+  """
+  libjpeg-turbo decodes the raw MJPEG buffer straight to YUV planes
+
+  Skips the YUV -> BGR conversion inside the JPEG decoder and the BGR -> YUV
+  conversion after it. JPEG stores full-range YCbCr, so a lookup table maps it
+  to the video range PyAV/cvtColor produce; the table lookup, rotation and
+  interleave all happen in the single copy into the NV12 buffer. Layouts the
+  plane mapping can't handle (grayscale, chroma narrower than 4:2:0) are
+  decoded through OpenCV instead.
+  """
+  name = 'libjpeg-turbo (MJPEG -> YUV planes -> NV12)'
+  raw_capture = True
+
+  def __init__(self, w, h, rotate_180, out, roi=None):
+    from turbojpeg import TurboJPEG  # ImportError/OSError if PyTurboJPEG or libturbojpeg is missing
+    self._tj = TurboJPEG()
+    self.w, self.h = w, h
+    self.rotate_180 = rotate_180
+    self._roi = roi
+    self._out = out
+    self._fallback = None
+    if roi is not None:
+      self._roi_y = np.empty((roi.out_h, roi.out_w), dtype=np.uint8)
+      self._roi_u = np.empty((roi.out_h // 2, roi.out_w // 2), dtype=np.uint8)
+      self._roi_v = np.empty_like(self._roi_u)
+      h, w = roi.out_h, roi.out_w
+    self._y = out[:h]
+    self._uv = out[h:].reshape(h // 2, w // 2, 2)
+
+    levels = np.arange(256, dtype=np.float32)
+    self._y_lut = np.round(16 + levels * 219 / 255).astype(np.uint8)
+    self._c_lut = np.round(128 + (levels - 128) * 224 / 255).astype(np.uint8)
+
+  def decode(self, frame):
+    planes = self._tj.decode_to_yuv_planes(frame.reshape(-1))
+    h, w = self.h, self.w
+
+    # Planes can be padded; chroma has h or h/2 rows and w or w/2 columns depending on the camera
+    row_step = col_step = 0
+    if len(planes) == 3:
+      y, u, v = planes
+      row_step = u.shape[0] // (h // 2)
+      col_step = u.shape[1] // (w // 2)
+    if row_step not in (1, 2) or col_step not in (1, 2):
+      self._decode_fallback(frame, planes)
+      return
+
+    y = y[:h, :w]
+    u = u[::row_step, ::col_step][:h // 2, :w // 2]
+    v = v[::row_step, ::col_step][:h // 2, :w // 2]
+    if self._roi is not None:
+      y = self._roi.resize(y, self._roi_y)
+      u = self._roi.resize(u, self._roi_u, sub=2)
+      v = self._roi.resize(v, self._roi_v, sub=2)
+    if self.rotate_180:
+      y, u, v = y[::-1, ::-1], u[::-1, ::-1], v[::-1, ::-1]
+
+    np.take(self._y_lut, y, out=self._y, mode='clip')
+    np.take(self._c_lut, u, out=self._uv[..., 0], mode='clip')
+    np.take(self._c_lut, v, out=self._uv[..., 1], mode='clip')
+
+  def _decode_fallback(self, frame, planes):
+    if self._fallback is None:
+      shapes = ', '.join('x'.join(map(str, p.shape)) for p in planes)
+      print(f"libjpeg-turbo: unsupported YUV layout ({shapes}), using OpenCV MJPEG decode")
+      self._fallback = OpenCVMjpegDecoder(self.w, self.h, self.rotate_180, self._out, self._roi)
+    bgr = cv.imdecode(frame.reshape(-1), cv.IMREAD_COLOR)
+    if bgr is not None:
+      self._fallback.decode(bgr)
+
+def make_mjpeg_decoder(w, h, rotate_180, out, roi=None):
+  if MJPEG_DECODER in ('auto', 'turbojpeg'):
+    try:
+      return TurboJpegDecoder(w, h, rotate_180, out, roi)
+    except (ImportError, OSError, RuntimeError) as e:
+      if MJPEG_DECODER == 'turbojpeg':
+        raise
+      print(f"libjpeg-turbo unavailable ({e}), using OpenCV MJPEG decode")
+  return OpenCVMjpegDecoder(w, h, rotate_180, out, roi)
 
 class Camera:
   def __init__(self, cam_type_state, stream_type, camera_id):
@@ -15,43 +265,203 @@ class Camera:
 
     # Use V4L2 backend for Linux webcams (more reliable)
     self.cap = cv.VideoCapture(camera_id, cv.CAP_V4L2)
-    
-    # Set MJPEG format (works best with USB webcams)
-    self.cap.set(cv.CAP_PROP_FOURCC, cv.VideoWriter_fourcc('M','J','P','G'))
-    self.cap.set(cv.CAP_PROP_FRAME_WIDTH, 1280.0)
-    self.cap.set(cv.CAP_PROP_FRAME_HEIGHT, 720.0)
-    self.cap.set(cv.CAP_PROP_FPS, 25.0)
 
-    self.W = self.cap.get(cv.CAP_PROP_FRAME_WIDTH)
-    self.H = self.cap.get(cv.CAP_PROP_FRAME_HEIGHT)
-    
     # Verify camera opened successfully
     if not self.cap.isOpened():
       raise RuntimeError(f"Failed to open camera at {camera_id}")
-    
-    print(f"Camera initialized: {self.W}x{self.H}")
+
+    self.fourcc = self._open_mode(camera_id)
+
+    self.W = self.cap.get(cv.CAP_PROP_FRAME_WIDTH)
+    self.H = self.cap.get(cv.CAP_PROP_FRAME_HEIGHT)
+
+    w, h = int(self.W), int(self.H)
+    self._src_w, self._src_h = w, h
+    self._roi = None
+    if CAPTURE_MODE == 'roi':
+      self._roi = RoiCropper(w, h, rotate_180=ROTATE_180)
+      # camerad sizes the VisionIPC buffers from W/H, so they describe the published frame
+      w, h = self._roi.out_w, self._roi.out_h
+      self.W, self.H = float(w), float(h)
+      self._roi_y = np.empty((h, w), dtype=np.uint8)
+      self._roi_uv = np.empty((h // 2, w // 2, 2), dtype=np.uint8)
+      full, roi = self._roi.savings()
+      print(f"ROI capture: {self._roi.crop_w}x{self._roi.crop_h} crop -> {w}x{h}, "
+            f"NV12 {roi // 1024} KB/frame instead of {full // 1024} KB ({100 * (1 - roi / full):.0f}% less)")
+    elif CAPTURE_MODE != 'full':
+      raise ValueError(f"Unknown CAPTURE_MODE '{CAPTURE_MODE}' (expected 'full' or 'roi')")
+
+    # One NV12 buffer reused for every frame: Y plane, then interleaved UV plane.
+    # VisionIPC copies it out during send(), so it can be refilled on the next frame.
+    self._nv12 = np.empty((h * 3 // 2, w), dtype=np.uint8)
+    self._y = self._nv12[:h]
+    self._uv = self._nv12[h:].reshape(h // 2, w // 2, 2)
+    self._nv12_view = memoryview(self._nv12.reshape(-1))
+    self._decoder = None
+    if self.fourcc == 'MJPG':
+      self._decoder = make_mjpeg_decoder(self._src_w, self._src_h, ROTATE_180, self._nv12, self._roi)
+      if self._decoder.raw_capture:
+        self.cap.set(cv.CAP_PROP_CONVERT_RGB, 0.0)  # Hand over the compressed buffer
+      print(f"MJPEG decoder: {self._decoder.name}")
+
+    # Capture thread -> read_frames hand-off: depth-1, latest wins. Three raw
+    # buffers rotate between "being captured", "latest" and "being converted".
+    self._bufs = [None, None, None]
+    self._latest = None    # (buf index, capture time ns) of the newest unconsumed frame
+    self._in_use = None    # buf index read_frames is converting
+    self._cond = threading.Condition()
+    self._stop = threading.Event()
+    self._thread = None
+    # Capture time of the frame just yielded, stamped by the capture thread (CLOCK_MONOTONIC, like
+    # VisionIPC/cereal timestamps): camerad can send it as timestamp_sof instead of its dequeue time
+    self.frame_timestamp_ns = 0
+    self.dropped_frames = 0
+
+    print(f"Camera initialized: {self.W}x{self.H} {self.fourcc}")
+
+  def _set_mode(self, fourcc, w, h, fps):
+    """Request a mode; returns the fourcc the driver actually took if it kept the frame rate"""
+    self.cap.set(cv.CAP_PROP_FOURCC, cv.VideoWriter_fourcc(*fourcc))
+    self.cap.set(cv.CAP_PROP_FRAME_WIDTH, float(w))
+    self.cap.set(cv.CAP_PROP_FRAME_HEIGHT, float(h))
+    self.cap.set(cv.CAP_PROP_FPS, fps)
+    got = int(self.cap.get(cv.CAP_PROP_FOURCC)).to_bytes(4, 'little').decode('ascii', errors='replace')
+    if got != fourcc or self.cap.get(cv.CAP_PROP_FPS) < TARGET_FPS - 1:
+      return None
+    # Raw formats are handed over undecoded; MJPEG is decoded to BGR by OpenCV
+    self.cap.set(cv.CAP_PROP_CONVERT_RGB, 0.0 if fourcc != 'MJPG' else 1.0)
+    return fourcc
+
+  def _open_mode(self, camera_id):
+    """
+    Go straight to the cached mode for this camera if there is one (a restart
+    after a crash, or caps the launcher already queried); negotiate otherwise
+    """
+    caps = v4l2_caps.cached_device(camera_id)
+    if caps is not None:
+      mode = caps.get('selected') or v4l2_caps.best_mode(caps['modes'], FOURCC_PREFERENCE, *CAPTURE_SIZE, TARGET_FPS - 1)
+      if mode is not None:
+        if self._set_mode(mode['fourcc'], mode['width'], mode['height'], mode['fps']):
+          print(f"Using cached mode {mode['fourcc']} {mode['width']}x{mode['height']} @ {mode['fps']} fps")
+          if 'selected' not in caps:
+            v4l2_caps.remember_mode(camera_id, mode)
+          return mode['fourcc']
+        print("Cached mode rejected by the camera, renegotiating")
+
+    fourcc = self._negotiate_format()
+    mode = {'fourcc': fourcc, 'width': int(self.cap.get(cv.CAP_PROP_FRAME_WIDTH)),
+            'height': int(self.cap.get(cv.CAP_PROP_FRAME_HEIGHT)), 'fps': self.cap.get(cv.CAP_PROP_FPS)}
+    if mode['fps'] >= TARGET_FPS - 1:  # Don't pin the below-target MJPEG fallback
+      v4l2_caps.remember_mode(camera_id, mode)
+    return fourcc
+
+  def _negotiate_format(self):
+    for fourcc in FOURCC_PREFERENCE:
+      if self._set_mode(fourcc, *CAPTURE_SIZE, TARGET_FPS):
+        return fourcc
+
+    # Nothing matched exactly - keep MJPEG, which works best with USB webcams
+    self.cap.set(cv.CAP_PROP_FOURCC, cv.VideoWriter_fourcc(*'MJPG'))
+    self.cap.set(cv.CAP_PROP_CONVERT_RGB, 1.0)
+    return 'MJPG'
 
   @classmethod
   def bgr2nv12(self, bgr):
+    # Reference PyAV path (allocates a frame and an array per call); see Nv12Converter
     frame = av.VideoFrame.from_ndarray(bgr, format='bgr24')
     return frame.reformat(format='nv12').to_ndarray()
 
-  def read_frames(self):
-    frame_count = 0
-    while True:
-      ret, frame = self.cap.read()
+  def _store_nv12(self, y, uv):
+    """Copy Y (h, w) and UV (h/2, w/2, 2) planes into the NV12 buffer, rotating if needed"""
+    if self._roi is not None:
+      y = self._roi.resize(y, self._roi_y)
+      uv = self._roi.resize(uv, self._roi_uv, sub=2)
+    if ROTATE_180:
+      # 180 degrees = reverse both axes; UV pairs stay in U,V order
+      y = y[::-1, ::-1]
+      uv = uv[::-1, ::-1]
+    np.copyto(self._y, y)
+    np.copyto(self._uv, uv)
+
+  def _convert(self, frame):
+    """Fill the NV12 buffer from one captured frame and return a view of it"""
+    h, w = self._src_h, self._src_w
+
+    if self.fourcc == 'NV12':
+      raw = frame.reshape(-1)[:h * w * 3 // 2]
+      if not ROTATE_180 and self._roi is None:
+        return memoryview(raw)  # Already in the right layout: no copy at all
+      nv12 = raw.reshape(h * 3 // 2, w)
+      self._store_nv12(nv12[:h], nv12[h:].reshape(h // 2, w // 2, 2))
+
+    elif self.fourcc == 'YUYV':
+      # Y0 U Y1 V per pixel pair; 4:2:2 -> 4:2:0 by taking chroma from every other row.
+      # Both are strided views, so the only copy is the one into the NV12 buffer.
+      yuyv = frame.reshape(-1)[:h * w * 2].reshape(h, w * 2)
+      uv = yuyv[0::2].reshape(h // 2, w // 2, 4)[..., 1::2]
+      self._store_nv12(yuyv[:, 0::2], uv)
+
+    else:
+      self._decoder.decode(frame)
+
+    return self._nv12_view
+
+  def _capture_time_ns(self):
+    # V4L2 stamps buffers with CLOCK_MONOTONIC; use it unless the driver reports something else
+    now_ns = time.monotonic_ns()
+    v4l2_ns = int(self.cap.get(cv.CAP_PROP_POS_MSEC) * 1e6)
+    if v4l2_ns > 0 and abs(now_ns - v4l2_ns) < 1e9:
+      return v4l2_ns
+    return now_ns
+
+  def _capture_loop(self):
+    write_idx = 0
+    failures = 0
+    while not self._stop.is_set():
+      ret, frame = self.cap.read(self._bufs[write_idx])
       if not ret or frame is None:
-        print(f"Failed to read frame {frame_count}, retrying...")
-        continue
-      
-      # Rotate the frame 180 degrees (flip both axes)
-      frame = cv.flip(frame, -1)
-      
-      try:
-        yuv = Camera.bgr2nv12(frame)
-        yield yuv.data.tobytes()
-        frame_count += 1
-      except Exception as e:
-        print(f"Error converting frame {frame_count}: {e}")
+        failures += 1
+        print(f"Failed to read frame ({failures} failures), retrying...")
         continue
-    self.cap.release()
+      timestamp_ns = self._capture_time_ns()
+      self._bufs[write_idx] = frame
+
+      with self._cond:
+        if self._latest is not None:
+          self.dropped_frames += 1  # Consumer never picked up the previous frame
+        self._latest = (write_idx, timestamp_ns)
+        # Next write goes to whichever buffer is neither latest nor being converted
+        write_idx = ({0, 1, 2} - {write_idx, self._in_use}).pop()
+        self._cond.notify()
+
+  def read_frames(self):
+    self._stop.clear()
+    self._thread = threading.Thread(target=self._capture_loop, name=f"capture-{self.cam_type_state}", daemon=True)
+    self._thread.start()
+
+    frame_count = 0
+    try:
+      while True:
+        with self._cond:
+          while self._latest is None:
+            self._cond.wait()
+          idx, self.frame_timestamp_ns = self._latest
+          self._latest = None
+          self._in_use = idx
+
+        try:
+          yield self._convert(self._bufs[idx])
+          frame_count += 1
+        except Exception as e:
+          print(f"Error converting frame {frame_count}: {e}")
+          continue
+
+        if frame_count % 500 == 0 and self.dropped_frames:
+          print(f"{self.cam_type_state}: {frame_count} frames sent, {self.dropped_frames} dropped (consumer too slow)")
+        if frame_count % 500 == 0 and self._roi is not None:
+          full, roi = self._roi.savings()
+          print(f"{self.cam_type_state}: ROI saved {frame_count * (full - roi) / 1e6:.0f} MB of NV12 conversion over {frame_count} frames")
+    finally:
+      self._stop.set()
+      self._thread.join(timeout=1.0)
+      self.cap.release()
@@ -0,0 +1,182 @@
+"""
+V4L2 capture-device capabilities, queried once and cached on disk
+
+The launcher enumerates every /dev/video* node here, and Camera reuses the
+result. Camera also records the mode it settled on, so a camerad restart
+after a crash reopens straight into that mode without renegotiating.
+"""
+import fcntl
+import json
+import os
+import struct
+from pathlib import Path
+
+CACHE_PATH = Path(os.environ.get('CAMERA_CAPS_CACHE', Path.home() / '.cache' / 'diy-auto-pilot' / 'camera_caps.json'))
+CACHE_VERSION = 1
+MAX_DEVICES = 10
+
+# camera.py passes its own settings; these defaults match them for the launcher
+DEFAULT_PREFERENCE = ('NV12', 'YUYV', 'MJPG')
+DEFAULT_SIZE = (1280, 720)
+DEFAULT_MIN_FPS = 24.0
+
+# ioctl numbers: _IOC(dir, 'V', nr, size) with dir 2 = read, 3 = read/write
+def _ioc(direction, nr, size):
+  return (direction << 30) | (size << 16) | (ord('V') << 8) | nr
+
+_CAPABILITY = struct.Struct('16s32s32sIII12x')          # struct v4l2_capability
+_FMTDESC = struct.Struct('III32sII12x')                  # struct v4l2_fmtdesc
+_FRMSIZE = struct.Struct('III6I8x')                      # struct v4l2_frmsizeenum
+_FRMIVAL = struct.Struct('IIIII6I8x')                    # struct v4l2_frmivalenum
+
+VIDIOC_QUERYCAP = _ioc(2, 0, _CAPABILITY.size)
+VIDIOC_ENUM_FMT = _ioc(3, 2, _FMTDESC.size)
+VIDIOC_ENUM_FRAMESIZES = _ioc(3, 74, _FRMSIZE.size)
+VIDIOC_ENUM_FRAMEINTERVALS = _ioc(3, 75, _FRMIVAL.size)
+
+V4L2_BUF_TYPE_VIDEO_CAPTURE = 1
+V4L2_CAP_VIDEO_CAPTURE = 0x00000001
+V4L2_CAP_DEVICE_CAPS = 0x80000000
+V4L2_FRMSIZE_TYPE_DISCRETE = 1
+V4L2_FRMIVAL_TYPE_DISCRETE = 1
+
+def device_path(camera_id):
+  return f"/dev/video{camera_id}" if isinstance(camera_id, int) else str(camera_id)
+
+def _enum(fd, request, layout, *fields):
+  """Yield unpacked structs for index 0, 1, ... until the driver returns EINVAL"""
+  index = 0
+  while True:
+    # Every struct starts with u32 index followed by the u32 filter fields
+    buf = bytearray(layout.size)
+    struct.pack_into(f'{1 + len(fields)}I', buf, 0, index, *fields)
+    try:
+      fcntl.ioctl(fd, request, buf)
+    except OSError:
+      return
+    yield layout.unpack(buf)
+    index += 1
+
+def _identity(fd):
+  driver, card, bus_info, _version, caps, device_caps = _CAPABILITY.unpack(fcntl.ioctl(fd, VIDIOC_QUERYCAP, bytes(_CAPABILITY.size)))
+  if caps & V4L2_CAP_DEVICE_CAPS:
+    caps = device_caps  # Capabilities of this node, not of the whole physical device
+  strip = lambda b: b.split(b'\0', 1)[0].decode(errors='replace')
+  return {'driver': strip(driver), 'card': strip(card), 'bus_info': strip(bus_info)}, caps
+
+def identify(path):
+  """Driver/card/bus of a device node, or None if it can't be queried"""
+  try:
+    fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+  except OSError:
+    return None
+  try:
+    return _identity(fd)[0]
+  except OSError:
+    return None
+  finally:
+    os.close(fd)
+
+def query_device(path):
+  """Enumerate capture formats, discrete frame sizes and frame rates of one device node"""
+  fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+  try:
+    identity, caps = _identity(fd)
+    modes = []
+    if caps & V4L2_CAP_VIDEO_CAPTURE:
+      for fmt in _enum(fd, VIDIOC_ENUM_FMT, _FMTDESC, V4L2_BUF_TYPE_VIDEO_CAPTURE):
+        pixfmt = fmt[4]
+        fourcc = pixfmt.to_bytes(4, 'little').decode('ascii', errors='replace')
+        for size in _enum(fd, VIDIOC_ENUM_FRAMESIZES, _FRMSIZE, pixfmt):
+          if size[2] != V4L2_FRMSIZE_TYPE_DISCRETE:
+            continue  # Stepwise sizes are rare on UVC webcams
+          w, h = size[3], size[4]
+          for ival in _enum(fd, VIDIOC_ENUM_FRAMEINTERVALS, _FRMIVAL, pixfmt, w, h):
+            num, den = ival[5], ival[6]
+            if ival[4] == V4L2_FRMIVAL_TYPE_DISCRETE and num:
+              modes.append({'fourcc': fourcc, 'width': w, 'height': h, 'fps': round(den / num, 2)})
+    return {**identity, 'modes': modes}
+  finally:
+    os.close(fd)
+
+def best_mode(modes, preference=DEFAULT_PREFERENCE, width=DEFAULT_SIZE[0], height=DEFAULT_SIZE[1], min_fps=DEFAULT_MIN_FPS):
+  """
+  Pick the capture mode camera.py wants: the requested size at min_fps or
+  better, in fourcc preference order; otherwise the largest size up to the
+  requested one that still keeps the frame rate. Among equals the lowest
+  adequate frame rate wins (less USB bandwidth, less to decode).
+  """
+  fast = [m for m in modes if m['fps'] >= min_fps and m['fourcc'] in preference]
+  exact = [m for m in fast if (m['width'], m['height']) == (width, height)]
+  smaller = [m for m in fast if m['width'] <= width and m['height'] <= height]
+  for candidates in (exact, smaller):
+    if candidates:
+      return min(candidates, key=lambda m: (-m['width'] * m['height'], preference.index(m['fourcc']), m['fps']))
+  return None
+
+def load():
+  try:
+    cache = json.loads(CACHE_PATH.read_text())
+  except (OSError, ValueError):
+    return {}
+  return cache.get('devices', {}) if cache.get('version') == CACHE_VERSION else {}
+
+def save(devices):
+  CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+  tmp = CACHE_PATH.with_suffix('.tmp')
+  tmp.write_text(json.dumps({'version': CACHE_VERSION, 'devices': devices}, indent=2))
+  tmp.replace(CACHE_PATH)  # Atomic, so a camerad crash mid-write can't leave half a file
+
+def discover(refresh=False):
+  """
+  Capture-capable video devices {path: caps}, from the cache when the same
+  camera is still on the same node; metadata-only nodes are left out
+  """
+  cached = load()
+  devices = {}
+  for i in range(MAX_DEVICES):
+    path = device_path(i)
+    if not os.path.exists(path):
+      continue
+    entry = cached.get(path)
+    identity = identify(path)
+    if identity is None:
+      continue
+    if refresh or entry is None or any(entry.get(k) != v for k, v in identity.items()):
+      try:
+        entry = query_device(path)
+      except OSError:
+        continue
+    devices[path] = entry
+  try:
+    save(devices)
+  except OSError as e:
+    print(f"Could not write camera cache {CACHE_PATH}: {e}")
+  return {path: caps for path, caps in devices.items() if caps['modes']}
+
+def cached_device(camera_id):
+  """Cached caps for a device, or None if it was never queried or a different camera is plugged in"""
+  path = device_path(camera_id)
+  entry = load().get(path)
+  if entry is None:
+    return None
+  identity = identify(path)
+  if identity is None or any(entry.get(k) != v for k, v in identity.items()):
+    return None
+  return entry
+
+def remember_mode(camera_id, mode):
+  """Record the mode Camera negotiated so the next open can go straight to it"""
+  path = device_path(camera_id)
+  devices = load()
+  entry = devices.get(path)
+  if entry is None:
+    identity = identify(path)
+    if identity is None:
+      return
+    entry = devices[path] = {**identity, 'modes': []}
+  entry['selected'] = mode
+  try:
+    save(devices)
+  except OSError as e:
+    print(f"Could not write camera cache {CACHE_PATH}: {e}")